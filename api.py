@@ -1,23 +1,71 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, model_validator
 from typing import List, Optional
-import pandas as pd
-from formulae import calculate_indices, categorize_indices
+import os
+import math
+import threading
+import numpy as np
+import importlib
+from formulae import calculate_indices_columns, categorize_indices_columns
+from formula_registry import FORMULAE
+from standards import get_standards, list_standards
+from result_cache import ResultCache, content_key
+from streaming import read_request_items, ndjson_response, json_response
 
 app = FastAPI(title="Water Quality Analysis API", version="1.0.0")
 
+# Bump when the index formulas or result rounding change, so cached results are not reused
+ANALYSIS_VERSION = 1
+
+# Results of /analyze (and the batch routes built on it) keyed by sample content.
+# ANALYSIS_CACHE_PATH adds an SQLite file that keeps results across restarts,
+# holding about ANALYSIS_CACHE_DISK_SIZE rows.
+result_cache = ResultCache(
+    maxsize=int(os.environ.get("ANALYSIS_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("ANALYSIS_CACHE_TTL", "3600")) or None,
+    path=os.environ.get("ANALYSIS_CACHE_PATH") or None,
+    disk_maxsize=int(os.environ.get("ANALYSIS_CACHE_DISK_SIZE", "100000")),
+)
+
 class WaterSample(BaseModel):
     ParameterName: str
     Ci: float
-    Si: float
-    Ii: float
-    MACi: float
+    # Taken from the standards table when omitted
+    Si: Optional[float] = None
+    Ii: Optional[float] = None
+    MACi: Optional[float] = None
 
 class SampleData(BaseModel):
     SampleID: int
     parameters: List[WaterSample]
+    # Standards version for Si/Ii/MACi; when set it replaces any values given
+    standards: Optional[str] = None
+
+class ColumnarBatch(BaseModel):
+    # One entry per measured parameter; a sample's rows share its SampleID
+    SampleID: List[int]
+    ParameterName: List[str]
+    Ci: List[Optional[float]]
+    # Omitted Si/Ii/MACi columns are filled from the default standards; setting
+    # standards takes all three from that version instead
+    Si: Optional[List[Optional[float]]] = None
+    Ii: Optional[List[Optional[float]]] = None
+    MACi: Optional[List[Optional[float]]] = None
+    standards: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {name: len(getattr(self, name)) for name in ("SampleID", "ParameterName", "Ci", "Si", "Ii", "MACi")
+                   if getattr(self, name) is not None}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"All columns must have the same length, got {lengths}")
+        return self
 
 class AnalysisResult(BaseModel):
+    # Indices added to the FORMULAE registry come after these, with their categories
+    model_config = ConfigDict(extra="allow")
+
     SampleID: int
     HPI: Optional[float]
     HPI_Category: str
@@ -30,28 +78,55 @@ class AnalysisResult(BaseModel):
 @app.post("/analyze", response_model=AnalysisResult)
 async def analyze_water_sample(sample_data: SampleData):
     try:
-        # Convert to DataFrame
-        df = pd.DataFrame([param.dict() for param in sample_data.parameters])
-        
-        # Calculate indices
-        HPI, HEI, Cd = calculate_indices(df)
-        
-        # Categorize indices
-        hpi_cat, hei_cat, cd_cat, conclusion = categorize_indices(HPI, HEI, Cd)
-        
-        return AnalysisResult(
-            SampleID=sample_data.SampleID,
-            HPI=None if pd.isna(HPI) else round(float(HPI), 2),
-            HPI_Category=hpi_cat,
-            HEI=None if pd.isna(HEI) else round(float(HEI), 2),
-            HEI_Category=hei_cat,
-            Cd=None if pd.isna(Cd) else round(float(Cd), 2),
-            Cd_Category=cd_cat,
-            OverallConclusion=conclusion
-        )
+        rows = _with_standards(sample_data)
+        key = _sample_key(rows)
+        if result_cache.path is None or result_cache.in_memory(key):
+            cached = result_cache.get(key)
+        else:
+            # A lookup that may read the SQLite tier runs off the event loop
+            cached = await run_in_threadpool(result_cache.get, key)
+        if cached is not None:
+            return AnalysisResult(SampleID=sample_data.SampleID, **cached)
+
+        # Every index of the registry, each followed by its category
+        values = FORMULAE.evaluate_sample({col: [row[col] for row in rows] for col in ("Ci", "Si", "Ii", "MACi")})
+        categories = FORMULAE.categorize_sample(values)
+        fields = {}
+        for name, value in values.items():
+            fields[name] = None if math.isnan(value) else round(value, 2)
+            if f"{name}_Category" in categories:
+                fields[f"{name}_Category"] = categories[f"{name}_Category"]
+        if "OverallConclusion" in categories:
+            fields["OverallConclusion"] = categories["OverallConclusion"]
+
+        result = AnalysisResult(SampleID=sample_data.SampleID, **fields)
+        result_cache.put(key, result.model_dump(exclude={"SampleID"}))
+        return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _sample_key(rows):
+    # Hash of the parameter set with standards filled in, independent of row order and SampleID.
+    # Keying on the resolved Si/Ii/MACi covers the standards version and edits to standards.json,
+    # and on the registry spec covers indices added at runtime.
+    cols = ("ParameterName", "Ci", "Si", "Ii", "MACi")
+    return content_key([ANALYSIS_VERSION, FORMULAE.spec, sorted([row[col] for col in cols] for row in rows)])
+
+def _with_standards(sample_data):
+    # Parameter dicts with Si/Ii/MACi filled in from the standards table where needed
+    rows = [param.model_dump() for param in sample_data.parameters]
+    if sample_data.standards is None and all(None not in (r["Si"], r["Ii"], r["MACi"]) for r in rows):
+        return rows
+    standards = get_standards(sample_data.standards)
+    codes = standards.codes([r["ParameterName"] for r in rows])
+    columns = standards.columns(codes)
+    for i, (row, code) in enumerate(zip(rows, codes)):
+        if sample_data.standards is not None or None in (row["Si"], row["Ii"], row["MACi"]):
+            if code < 0:
+                raise ValueError(f"No standard for '{row['ParameterName']}' in version '{standards.version}'")
+            row.update({col: float(values[i]) for col, values in columns.items()})
+    return rows
+
 @app.post("/analyze-batch", response_model=List[AnalysisResult])
 async def analyze_batch_samples(samples: List[SampleData]):
     results = []
@@ -63,6 +138,117 @@ async def analyze_batch_samples(samples: List[SampleData]):
             raise HTTPException(status_code=400, detail=f"Error processing sample {sample.SampleID}: {str(e)}")
     return results
 
+@app.post("/analyze-batch/columnar")
+async def analyze_batch_columnar(batch: ColumnarBatch):
+    """
+    Analyzes many samples given as parallel columns (one entry per parameter) in
+    a single vectorized pass. Returns {"results": [AnalysisResult, ...],
+    "errors": [{"SampleID": ..., "error": ...}, ...]}, both in order of first
+    appearance; a sample with missing values is reported in errors only.
+    """
+    names = ("Ci", "Si", "Ii", "MACi")
+    given = {name: np.array(getattr(batch, name), dtype=float) for name in names if getattr(batch, name) is not None}
+    if batch.standards is None and len(given) == len(names):
+        columns = [given[name] for name in names]
+        samples, HPI, HEI, Cd = calculate_indices_columns(batch.SampleID, *columns)
+        unknown = np.zeros(len(batch.SampleID), dtype=bool)
+    else:
+        # Standards broadcast by parameter code, with their constants precomputed
+        try:
+            standards = get_standards(batch.standards)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=str(e.args[0]))
+        parameters = standards.codes(batch.ParameterName)
+        filled = {"Ci": given["Ci"], **standards.columns(parameters)}
+        if batch.standards is None and len(given) > 1:
+            # Columns the client sent are used as given; only the omitted ones come from
+            # the standards, so the precomputed constants no longer apply
+            filled.update(given)
+            columns = [filled[name] for name in names]
+            samples, HPI, HEI, Cd = calculate_indices_columns(batch.SampleID, *columns)
+        else:
+            columns = [filled[name] for name in names]
+            samples, HPI, HEI, Cd = calculate_indices_columns(batch.SampleID, *columns, parameters=parameters,
+                                                              constants=standards.constants(FORMULAE))
+        unknown = parameters < 0
+    categories = categorize_indices_columns(HPI, HEI, Cd)
+
+    # Rows with a null value, or without a standard, invalidate their sample
+    missing = np.isnan(np.vstack(columns)) & ~unknown
+    failed = {}
+    for row in np.flatnonzero(missing.any(axis=0) | unknown):
+        if unknown[row]:
+            problem = f"{batch.ParameterName[row]} (no standard)"
+        else:
+            problem = f"{batch.ParameterName[row]} ({', '.join(n for n, bad in zip(names, missing[:, row]) if bad)})"
+        failed.setdefault(batch.SampleID[row], []).append(problem)
+
+    results, errors = [], []
+    for sample_id, hpi, hei, cd, hpi_cat, hei_cat, cd_cat, conclusion in zip(
+            samples.tolist(), HPI.tolist(), HEI.tolist(), Cd.tolist(), *(c.tolist() for c in categories)):
+        if sample_id in failed:
+            errors.append({"SampleID": sample_id, "error": "Missing values for " + "; ".join(failed[sample_id])})
+            continue
+        results.append({
+            "SampleID": sample_id,
+            "HPI": None if not math.isfinite(hpi) else round(hpi, 2),
+            "HPI_Category": hpi_cat,
+            "HEI": None if not math.isfinite(hei) else round(hei, 2),
+            "HEI_Category": hei_cat,
+            "Cd": None if not math.isfinite(cd) else round(cd, 2),
+            "Cd_Category": cd_cat,
+            "OverallConclusion": conclusion,
+        })
+    return json_response({"results": results, "errors": errors})
+
+@app.post("/analyze-batch/stream")
+async def analyze_batch_stream(request: Request):
+    """
+    Streams one NDJSON result line per sample, in input order. The body is either
+    a JSON array of SampleData or NDJSON with one SampleData object per line.
+    A sample that fails yields {"SampleID": ..., "error": ...} instead of
+    aborting the rest of the batch.
+    """
+    items = await read_request_items(request)
+
+    async def results():
+        for item in items:
+            try:
+                result = await analyze_water_sample(SampleData.model_validate(item))
+                yield result.model_dump()
+            except Exception as e:
+                sample_id = item.get("SampleID") if isinstance(item, dict) else None
+                yield {"SampleID": sample_id, "error": getattr(e, "detail", str(e))}
+
+    return ndjson_response(results())
+
+@app.get("/standards")
+async def standards_versions():
+    """The available standards versions and the default one."""
+    default, versions = list_standards()
+    return {"default": default, "versions": versions}
+
+@app.get("/standards/{version}")
+async def standards_table(version: str):
+    """Si, Ii, MACi and unit per parameter for one standards version."""
+    try:
+        return get_standards(version).to_dict()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+@app.get("/cache")
+async def cache_stats():
+    """Hit and miss counters of the analysis result cache."""
+    info = result_cache.info()
+    return {**info._asdict(), "hit_rate": round(info.hit_rate, 4), "ttl": result_cache.ttl,
+            "persistent": result_cache.path is not None}
+
+@app.on_event("startup")
+def warm_imports():
+    # WARM_ON_STARTUP=1 imports pandas in the background instead of on the first request
+    if os.environ.get("WARM_ON_STARTUP", "").lower() in ("1", "true", "yes"):
+        threading.Thread(target=importlib.import_module, args=("pandas",), daemon=True).start()
+
 @app.get("/")
 async def root():
     return {"message": "Water Quality Analysis API"}
\ No newline at end of file
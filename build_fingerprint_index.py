@@ -0,0 +1,18 @@
+import argparse
+import time
+import deepchem_integration as dci
+
+# === Fingerprint the ZINC dataset for similarity search ===
+# Writes the memory-mapped fingerprint index that /similar and /bulk_similar scan.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the similarity search index from the local ZINC dataset.")
+    parser.add_argument("--output", default=dci.FINGERPRINT_INDEX, help="index directory")
+    parser.add_argument("--radius", type=int, default=dci.FINGERPRINT_RADIUS, help="Morgan fingerprint radius")
+    parser.add_argument("--bits", type=int, default=dci.FINGERPRINT_BITS, help="fingerprint length (multiple of 64)")
+    parser.add_argument("--chunksize", type=int, default=4096, help="molecules per worker task")
+    args = parser.parse_args()
+
+    start = time.time()
+    count = dci.build_fingerprint_index(args.output, radius=args.radius, n_bits=args.bits, chunksize=args.chunksize)
+    dci.shutdown_pool()
+    print(f"{count} molecules indexed in {args.output} ({time.time() - start:.1f}s)")
@@ -1,23 +1,63 @@
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
+import os
 import traceback
 
 import deepchem_integration as dci
+from streaming import read_request_items, ndjson_response
 
 app = FastAPI(title="DeepChem Property Prediction API", description="API for molecular property prediction using SMILES and ZINC dataset.")
 
 class SmilesRequest(BaseModel):
     smiles: str
 
+def smiles_filters(min_logP: Optional[float] = None, max_logP: Optional[float] = None,
+                   min_qed: Optional[float] = None, max_qed: Optional[float] = None,
+                   min_SAS: Optional[float] = None, max_SAS: Optional[float] = None):
+    """Range filters on the precomputed ZINC columns, as query parameters."""
+    ranges = {"logP": (min_logP, max_logP), "qed": (min_qed, max_qed), "SAS": (min_SAS, max_SAS)}
+    return {column: bounds for column, bounds in ranges.items() if bounds != (None, None)}
+
 @app.get("/load_smiles", response_model=List[str])
-def load_smiles():
-    """Load all SMILES from the local ZINC dataset."""
+def load_smiles(ranges: dict = Depends(smiles_filters)):
+    """Load all SMILES from the local ZINC dataset, optionally filtered on logP/qed/SAS ranges."""
+    try:
+        if not ranges:
+            return dci.load_smiles()
+        df, _ = dci.get_zinc_table()
+        return df['smiles'].to_numpy()[dci.select_smiles(ranges)].tolist()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/smiles")
+def smiles_page(cursor: Optional[str] = None, limit: int = Query(1000, ge=1, le=100000),
+                ranges: dict = Depends(smiles_filters)):
+    """
+    One page of SMILES from the ZINC dataset. Pass the returned next_cursor to get
+    the following page; it is null on the last page.
+    """
     try:
-        return dci.load_smiles()
+        return dci.smiles_page(cursor, limit, ranges)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/smiles/stream")
+def smiles_stream(format: str = Query("text", pattern="^(text|ndjson)$"), ranges: dict = Depends(smiles_filters)):
+    """
+    Streams the (filtered) ZINC SMILES: one per line as plain text, or as NDJSON
+    objects that also carry the precomputed logP/qed/SAS values.
+    """
+    try:
+        dci.get_zinc_table()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/plain"
+    return StreamingResponse(dci.iter_smiles_lines(ranges, format), media_type=media_type)
+
 @app.post("/get_all_properties")
 def get_all_properties(req: SmilesRequest):
     """Get all properties for a given SMILES string."""
@@ -106,128 +146,124 @@ class BulkSmilesRequest(BaseModel):
     smiles_list: List[str]
 
 @app.post("/bulk_get_all_properties")
-def bulk_get_all_properties(req: BulkSmilesRequest):
+async def bulk_get_all_properties(req: BulkSmilesRequest):
     """
     Get all properties for a list of SMILES strings.
     """
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            result = dci.get_all_properties(smiles)
-        except Exception as e:
-            result = {"smiles": smiles, "error": str(e)}
-        results.append(result)
-    return results
+    return await dci.batch_properties_async(req.smiles_list)
+
+@app.post("/bulk_get_all_properties/stream")
+async def bulk_get_all_properties_stream(request: Request):
+    """
+    Streams all properties as NDJSON, one line per SMILES as soon as it is computed.
+    The body is either a BulkSmilesRequest JSON object or NDJSON with one SMILES
+    per line (a JSON string or {"smiles": ...}).
+    """
+    items = await read_request_items(request, "smiles_list")
+    smiles_list = [item.get("smiles") if isinstance(item, dict) else item for item in items]
+    return ndjson_response(dci.stream_batch_properties(smiles_list))
+
+class BulkPropertiesRequest(BaseModel):
+    smiles_list: List[str]
+    properties: List[str]
+
+@app.post("/bulk_get_properties")
+async def bulk_get_properties(req: BulkPropertiesRequest):
+    """
+    Get only the requested properties for a list of SMILES strings.
+    Each molecule is parsed once and descriptors shared between properties are computed once.
+    """
+    unknown = [prop for prop in req.properties if prop not in dci.PROPERTIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown properties: {unknown}. Available: {dci.PROPERTIES}")
+    return await dci.batch_properties_async(req.smiles_list, req.properties)
 
 @app.post("/bulk_predict_toxicity")
-def bulk_predict_toxicity(req: BulkSmilesRequest):
+async def bulk_predict_toxicity(req: BulkSmilesRequest):
     """
     Predict toxicity for a list of SMILES strings.
     """
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_toxicity(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "toxicity": value})
-    return results
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["toxicity"]))
 
 @app.post("/bulk_predict_solubility")
-def bulk_predict_solubility(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_solubility(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "solubility": value})
-    return results
+async def bulk_predict_solubility(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["solubility"]))
 
 @app.post("/bulk_predict_bioactivity")
-def bulk_predict_bioactivity(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_bioactivity(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "bioactivity": value})
-    return results
+async def bulk_predict_bioactivity(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["bioactivity"]))
 
 @app.post("/bulk_predict_permeability")
-def bulk_predict_permeability(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_permeability(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "permeability": value})
-    return results
+async def bulk_predict_permeability(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["permeability"]))
 
 @app.post("/bulk_predict_logP")
-def bulk_predict_logP(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_logP(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "logP": value})
-    return results
+async def bulk_predict_logP(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["logP"]))
 
 @app.post("/bulk_predict_stability")
-def bulk_predict_stability(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_stability(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "stability": value})
-    return results
+async def bulk_predict_stability(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["stability"]))
 
 @app.post("/bulk_predict_binding_affinity")
-def bulk_predict_binding_affinity(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_binding_affinity(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "binding_affinity": value})
-    return results
+async def bulk_predict_binding_affinity(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["binding_affinity"]))
 
 @app.post("/bulk_predict_mutagenicity")
-def bulk_predict_mutagenicity(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_mutagenicity(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "mutagenicity": value})
-    return results
+async def bulk_predict_mutagenicity(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["mutagenicity"]))
 
 @app.post("/bulk_predict_toxicological_endpoints")
-def bulk_predict_toxicological_endpoints(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_toxicological_endpoints(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "toxicological_endpoints": value})
-    return results
+async def bulk_predict_toxicological_endpoints(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["toxicological_endpoints"]))
 
 @app.post("/bulk_predict_custom_hmpi")
-def bulk_predict_custom_hmpi(req: BulkSmilesRequest):
-    results = []
-    for smiles in req.smiles_list:
-        try:
-            value = dci.predict_custom_hmpi(smiles)
-        except Exception as e:
-            value = str(e)
-        results.append({"smiles": smiles, "custom_hmpi": value})
-    return results
\ No newline at end of file
+async def bulk_predict_custom_hmpi(req: BulkSmilesRequest):
+    return await bulk_get_properties(BulkPropertiesRequest(smiles_list=req.smiles_list, properties=["custom_hmpi"]))
+
+class SimilarityRequest(BaseModel):
+    smiles: str
+    k: int = Field(10, ge=1, le=1000)
+    min_similarity: float = Field(0.0, ge=0.0, le=1.0)
+
+class BulkSimilarityRequest(BaseModel):
+    smiles_list: List[str]
+    k: int = Field(10, ge=1, le=1000)
+    min_similarity: float = Field(0.0, ge=0.0, le=1.0)
+
+@app.post("/similar")
+def similar_molecules(req: SimilarityRequest):
+    """
+    The k ZINC molecules nearest to a SMILES by Tanimoto similarity of Morgan
+    fingerprints, most similar first, optionally only those >= min_similarity.
+    """
+    try:
+        return {"smiles": req.smiles, "results": dci.similar_molecules(req.smiles, req.k, req.min_similarity)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/bulk_similar")
+async def bulk_similar_molecules(req: BulkSimilarityRequest):
+    """
+    /similar for a list of SMILES, in input order; large lists are scanned on
+    every core. An invalid SMILES gets {"smiles": ..., "error": ...}.
+    """
+    try:
+        return await dci.similar_molecules_batch_async(req.smiles_list, req.k, req.min_similarity)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.on_event("startup")
+def warm_caches():
+    # Imports and dataset loading are deferred to first use; WARM_ON_STARTUP=1
+    # does them in the background instead so the first requests are not slow
+    if os.environ.get("WARM_ON_STARTUP", "").lower() in ("1", "true", "yes"):
+        dci.warm_in_background()
+
+@app.on_event("shutdown")
+def shutdown_batch_pool():
+    dci.shutdown_pool()
\ No newline at end of file
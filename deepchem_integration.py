@@ -1,11 +1,8 @@
 """
 Module to handle property predictions for molecules using SMILES input (RDKit + precomputed CSV).
 """
-import pandas as pd
-import requests
-import csv
-from rdkit import Chem
-from rdkit.Chem import Crippen, Descriptors, Lipinski, QED
+import importlib
+import numpy as np
 
 ZINC_URL = "https://raw.githubusercontent.com/aspuru-guzik-group/chemical_vae/master/data/zinc_250k.csv"
 ZINC_LOCAL = "zinc_250k.csv"  # Update path if needed
@@ -24,88 +21,295 @@ PROPERTIES = [
 ]
 
 
+# pandas and RDKit are imported on first use, not when this module (and the API
+# that wraps it) is imported; module attributes dci.pd, dci.Chem, ... still work
+_LAZY_MODULES = {
+    "pd": "pandas",
+    "Chem": "rdkit.Chem",
+    "Crippen": "rdkit.Chem.Crippen",
+    "Descriptors": "rdkit.Chem.Descriptors",
+    "Lipinski": "rdkit.Chem.Lipinski",
+    "QED": "rdkit.Chem.QED",
+}
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return importlib.import_module(_LAZY_MODULES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 import os
+import json
+import math
+import queue
+import asyncio
+import sqlite3
+import collections
+import threading
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, lru_cache
+
+# ZINC dataset, parsed once and shared by load_smiles / get_precomputed_row
+_zinc_lock = threading.Lock()
+_zinc = None            # (cleaned DataFrame, SMILES -> row position, see _read_zinc)
+_zinc_stamp = None      # (mtime_ns, size) of the file the table was read from
+
+def _read_zinc(stamp):
+    import pandas as pd
+    df = pd.read_csv(ZINC_LOCAL, skip_blank_lines=True)
+    df.columns = df.columns.str.strip().str.replace('"', '')
+    if 'smiles' not in df.columns:
+        raise Exception(f"'smiles' column not found! Columns are: {df.columns.tolist()}")
+    df['smiles'] = df['smiles'].astype(str).str.replace('"', '').str.replace('\n', '').str.strip()
+    # Every row is a key under its canonical SMILES as well as its own spelling, and every
+    # spelling maps to the first row of its molecule, so lookups do not depend on how the
+    # dataset happens to write a molecule
+    index = {}
+    for pos, (smiles, canonical) in enumerate(zip(df['smiles'], _zinc_canonical(df['smiles'].tolist(), stamp))):
+        first = index.setdefault(canonical, pos) if canonical else pos
+        index.setdefault(smiles, first)
+    return df, index
+
+def _zinc_canonical(smiles_list, stamp, chunksize=2048):
+    # Canonical SMILES per ZINC row ("" where RDKit cannot parse it). That parses every molecule,
+    # so the result is kept next to the dataset in ZINC_LOCAL + ".canonical" for this file version
+    path = ZINC_LOCAL + ".canonical"
+    header = f"{stamp[0]} {stamp[1]} {len(smiles_list)}"
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        if lines[0] == header and len(lines) == len(smiles_list) + 1:
+            return lines[1:]
+    except OSError:
+        pass
+    chunks = [smiles_list[i:i + chunksize] for i in range(0, len(smiles_list), chunksize)]
+    if len(chunks) > 1:
+        canonical = [c or "" for chunk in get_pool().map(_canonical_chunk, chunks) for c in chunk]
+    else:
+        canonical = [c or "" for chunk in chunks for c in _canonical_chunk(chunk)]
+    try:
+        _replace_file(path, lambda f: f.write("\n".join([header, *canonical]).encode("utf-8")))
+    except OSError:
+        pass    # e.g. a read-only data directory: computed again on the next load
+    return canonical
+
+def get_zinc_table(reload=False):
+    """
+    Returns (table, index) for the local ZINC dataset, loading it on first use.
+    The file is re-read when it changed on disk or when reload=True.
+    Raises FileNotFoundError if the dataset is missing.
+    """
+    global _zinc, _zinc_stamp
+    if not os.path.exists(ZINC_LOCAL):
+        raise FileNotFoundError(f"Dataset not found at {ZINC_LOCAL}. Please download manually.")
+    stat = os.stat(ZINC_LOCAL)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if reload or stamp != _zinc_stamp:
+        with _zinc_lock:
+            if reload or stamp != _zinc_stamp:
+                # One assignment, so readers never see a table from one load and an index from another
+                _zinc = _read_zinc(stamp)
+                _zinc_stamp = stamp
+    return _zinc
+
+def reload_zinc():
+    """Forces the ZINC dataset to be re-read from disk."""
+    get_zinc_table(reload=True)
+
 def load_smiles():
     """
     Loads SMILES from local ZINC dataset. If not present, does NOT download, just raises error.
     Returns list of cleaned SMILES strings.
     """
-    if not os.path.exists(ZINC_LOCAL):
-        raise FileNotFoundError(f"Dataset not found at {ZINC_LOCAL}. Please download manually.")
-    df = pd.read_csv(ZINC_LOCAL, quoting=csv.QUOTE_ALL, engine='python', skip_blank_lines=True)
-    df.columns = df.columns.str.strip().str.replace('"', '')
-    if 'smiles' not in df.columns:
-        raise Exception(f"'smiles' column not found! Columns are: {df.columns.tolist()}")
-    df['smiles'] = df['smiles'].astype(str).str.replace('"', '').str.replace('\n', '').str.strip()
+    df, _ = get_zinc_table()
     return df['smiles'].dropna().tolist()
 
+# Precomputed ZINC columns that listings can be filtered on
+FILTER_COLUMNS = ["logP", "qed", "SAS"]
+
+def select_smiles(ranges=None, start=0, limit=None):
+    """
+    Row positions in the ZINC table, from position start on, whose precomputed
+    columns fall within ranges ({column: (min, max)}, either bound may be None).
+    At most limit positions are returned. Evaluated with vectorized masks.
+    """
+    df, _ = get_zinc_table()
+    mask = np.ones(len(df) - start, dtype=bool) if start < len(df) else np.zeros(0, dtype=bool)
+    for column, (low, high) in (ranges or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter on '{column}', choose from {FILTER_COLUMNS}")
+        values = df[column].to_numpy()[start:]
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    positions = np.flatnonzero(mask) + start
+    return positions if limit is None else positions[:limit]
+
+def smiles_page(cursor=None, limit=1000, ranges=None):
+    """
+    One page of (filtered) SMILES. cursor is the next_cursor of the previous
+    page (None for the first); next_cursor is None on the last page.
+    """
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if start < 0 or limit < 1:
+        raise ValueError("cursor must be >= 0 and limit >= 1")
+    df, _ = get_zinc_table()
+    positions = select_smiles(ranges, start, limit + 1)
+    next_cursor = str(positions[limit]) if len(positions) > limit else None
+    return {"smiles": df['smiles'].to_numpy()[positions[:limit]].tolist(), "next_cursor": next_cursor}
+
+def iter_smiles_lines(ranges=None, fmt="text", batch_size=10000):
+    """
+    Yields the (filtered) dataset as text blocks of batch_size lines: one SMILES
+    per line for fmt="text", or NDJSON objects with the precomputed columns.
+    """
+    df, _ = get_zinc_table()
+    positions = select_smiles(ranges)
+    columns = ['smiles'] + [c for c in FILTER_COLUMNS if c in df.columns]
+    # Select the columns once; doing it per batch would copy the whole table every time
+    records = df[columns] if fmt == "ndjson" else None
+    smiles = df['smiles'].to_numpy()
+    for i in range(0, len(positions), batch_size):
+        batch = positions[i:i + batch_size]
+        if fmt == "ndjson":
+            yield records.iloc[batch].to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n"
+        else:
+            yield "\n".join(smiles[batch]) + "\n"
+
 def get_precomputed_row(smiles):
     """
-    Returns the row from the local ZINC dataset matching the cleaned SMILES string, or None if not found.
+    Returns the row from the local ZINC dataset for a SMILES string or MoleculeContext, or None if not found.
+    The cleaned string is tried first, then its canonical SMILES; the index holds every row under its canonical
+    SMILES, so any spelling of a ZINC molecule finds the same row.
     """
-    if not os.path.exists(ZINC_LOCAL):
+    try:
+        df, index = get_zinc_table()
+    except FileNotFoundError:
         return None
-    df = pd.read_csv(ZINC_LOCAL, quoting=csv.QUOTE_ALL, engine='python', skip_blank_lines=True)
-    df.columns = df.columns.str.strip().str.replace('"', '')
-    df['smiles'] = df['smiles'].astype(str).str.replace('"', '').str.replace('\n', '').str.strip()
-    smiles_clean = smiles.strip().replace('\n', '').replace('"', '')
-    row = df[df['smiles'] == smiles_clean]
-    if not row.empty:
-        return row.iloc[0]
+    ctx = _as_context(smiles)
+    smiles_clean = ctx.smiles.strip().replace('\n', '').replace('"', '')
+    pos = index.get(smiles_clean)
+    if pos is None and ctx.canonical is not None:
+        pos = index.get(ctx.canonical)
+    if pos is not None:
+        return df.iloc[pos]
     return None
 
+class MoleculeContext:
+    """
+    One molecule shared by all predictors: the SMILES is looked up in ZINC and
+    parsed by RDKit at most once, and each descriptor is computed on first use.
+    """
+    def __init__(self, smiles, canonical=None):
+        self.smiles = smiles
+        if canonical is not None:
+            self.canonical = canonical  # already known, e.g. from a batch's canonicalization pass
+
+    @cached_property
+    def row(self):
+        return get_precomputed_row(self)
+
+    @cached_property
+    def mol(self):
+        from rdkit import Chem
+        return Chem.MolFromSmiles(self.smiles)
+
+    @cached_property
+    def canonical(self):
+        from rdkit import Chem
+        return Chem.MolToSmiles(self.mol) if self.mol is not None else None
+
+    @cached_property
+    def qed(self):
+        from rdkit.Chem import QED
+        return QED.qed(self.mol)
+
+    @cached_property
+    def mol_wt(self):
+        from rdkit.Chem import Descriptors
+        return Descriptors.MolWt(self.mol)
+
+    @cached_property
+    def logp(self):
+        from rdkit.Chem import Crippen
+        return Crippen.MolLogP(self.mol)
+
+    @cached_property
+    def h_donors(self):
+        from rdkit.Chem import Lipinski
+        return Lipinski.NumHDonors(self.mol)
+
+    @cached_property
+    def rotatable_bonds(self):
+        from rdkit.Chem import Lipinski
+        return Lipinski.NumRotatableBonds(self.mol)
+
+    @cached_property
+    def ring_count(self):
+        return self.mol.GetRingInfo().NumRings()
+
+    @cached_property
+    def n_count(self):
+        return sum(1 for atom in self.mol.GetAtoms() if atom.GetSymbol() == 'N')
+
+def _as_context(smiles):
+    # Predictors accept a SMILES string or an existing MoleculeContext
+    return smiles if isinstance(smiles, MoleculeContext) else MoleculeContext(smiles)
+
 def predict_toxicity(smiles):
-    row = get_precomputed_row(smiles)
+    ctx = _as_context(smiles)
+    row = ctx.row
     if row is not None and 'qed' in row:
         qed = row['qed']
     else:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
+        if ctx.mol is None:
             return None
-        qed = QED.qed(mol)
+        qed = ctx.qed
     return 1.0 - float(qed)
 
 def predict_solubility(smiles):
-    row = get_precomputed_row(smiles)
+    ctx = _as_context(smiles)
+    row = ctx.row
     if row is not None and 'SAS' in row:
         sas = row['SAS']
         return -float(sas)
     else:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
+        if ctx.mol is None:
             return None
-        mw = Descriptors.MolWt(mol)
-        return -mw / 100.0
+        return -ctx.mol_wt / 100.0
 
 def predict_bioactivity(smiles):
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    ctx = _as_context(smiles)
+    if ctx.mol is None:
         return None
-    donors = Lipinski.NumHDonors(mol)
-    return donors > 1
+    return ctx.h_donors > 1
 
 def predict_permeability(smiles):
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    ctx = _as_context(smiles)
+    if ctx.mol is None:
         return None
-    rot_bonds = Lipinski.NumRotatableBonds(mol)
-    return max(0, 1 - rot_bonds / 10.0)
+    return max(0, 1 - ctx.rotatable_bonds / 10.0)
 
 def predict_logP(smiles):
-    row = get_precomputed_row(smiles)
+    ctx = _as_context(smiles)
+    row = ctx.row
     if row is not None and 'logP' in row:
         return float(row['logP'])
     else:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
+        if ctx.mol is None:
             return None
-        return Crippen.MolLogP(mol)
+        return ctx.logp
 
 def predict_stability(smiles):
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    ctx = _as_context(smiles)
+    if ctx.mol is None:
         return None
-    rings = mol.GetRingInfo().NumRings()
+    rings = ctx.ring_count
     if rings == 0:
         return "low"
     elif rings < 3:
@@ -114,51 +318,856 @@ def predict_stability(smiles):
         return "high"
 
 def predict_binding_affinity(smiles):
-    row = get_precomputed_row(smiles)
+    ctx = _as_context(smiles)
+    row = ctx.row
     if row is not None and 'qed' in row:
         return float(row['qed'])
     else:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
+        if ctx.mol is None:
             return None
-        return QED.qed(mol)
+        return ctx.qed
 
 def predict_mutagenicity(smiles):
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    ctx = _as_context(smiles)
+    if ctx.mol is None:
         return None
-    n_atoms = sum(1 for atom in mol.GetAtoms() if atom.GetSymbol() == 'N')
-    return n_atoms > 2
+    return ctx.n_count > 2
 
 def predict_toxicological_endpoints(smiles):
     return None
 
 def predict_custom_hmpi(smiles):
-    logp = predict_logP(smiles)
-    sol = predict_solubility(smiles)
-    row = get_precomputed_row(smiles)
-    if row is not None and 'qed' in row:
-        qed = float(row['qed'])
-    else:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
-            return None
-        qed = QED.qed(mol)
+    ctx = _as_context(smiles)
+    logp = predict_logP(ctx)
+    sol = predict_solubility(ctx)
+    qed = predict_binding_affinity(ctx)
     if None in (logp, sol, qed):
         return None
     return (logp + sol + qed) / 3.0
 
 def get_all_properties(smiles):
+    """
+    Every property of one molecule: from the descriptor store, else from the
+    property cache, else computed live and queued for the property cache.
+    """
+    ctx = _as_context(smiles)
+    stored = lookup_descriptors(ctx)
+    if stored is not None:
+        return {"smiles": ctx.smiles, **stored}
+    cache = get_property_cache()
+    if cache is None:
+        return _live_properties(ctx)
+    keys = _cache_keys(ctx)
+    found = cache.get_many(keys)
+    stored = _first_cached(keys, found)
+    if stored is None:
+        result = _live_properties(ctx)
+        stored = {prop: value for prop, value in result.items() if prop != "smiles"}
+    else:
+        result = {"smiles": ctx.smiles, **stored}
+    cache.put_many([(key, stored) for key in keys if key not in found])
+    return result
+
+def _uncached_properties(ctx):
+    # get_all_properties without the property cache, for callers that batch their cache queries
+    stored = lookup_descriptors(ctx)
+    if stored is not None:
+        return {"smiles": ctx.smiles, **stored}
+    return _live_properties(ctx)
+
+def _live_properties(ctx):
     return {
-        "smiles": smiles,
-        "toxicity": predict_toxicity(smiles),
-        "solubility": predict_solubility(smiles),
-        "bioactivity": predict_bioactivity(smiles),
-        "permeability": predict_permeability(smiles),
-        "logP": predict_logP(smiles),
-        "stability": predict_stability(smiles),
-        "binding_affinity": predict_binding_affinity(smiles),
-        "mutagenicity": predict_mutagenicity(smiles),
-        "toxicological_endpoints": predict_toxicological_endpoints(smiles),
-        "custom_hmpi": predict_custom_hmpi(smiles)
-    }
\ No newline at end of file
+        "smiles": ctx.smiles,
+        "toxicity": predict_toxicity(ctx),
+        "solubility": predict_solubility(ctx),
+        "bioactivity": predict_bioactivity(ctx),
+        "permeability": predict_permeability(ctx),
+        "logP": predict_logP(ctx),
+        "stability": predict_stability(ctx),
+        "binding_affinity": predict_binding_affinity(ctx),
+        "mutagenicity": predict_mutagenicity(ctx),
+        "toxicological_endpoints": predict_toxicological_endpoints(ctx),
+        "custom_hmpi": predict_custom_hmpi(ctx)
+    }
+
+PREDICTORS = {
+    "toxicity": predict_toxicity,
+    "solubility": predict_solubility,
+    "bioactivity": predict_bioactivity,
+    "permeability": predict_permeability,
+    "logP": predict_logP,
+    "stability": predict_stability,
+    "binding_affinity": predict_binding_affinity,
+    "mutagenicity": predict_mutagenicity,
+    "toxicological_endpoints": predict_toxicological_endpoints,
+    "custom_hmpi": predict_custom_hmpi
+}
+
+# Batch engine: SMILES lists are split into chunks and computed in a process
+# pool that is created on first use and kept alive across requests.
+BATCH_CHUNKSIZE = 256
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        # Replace a pool whose workers died so one crash does not break every later request
+        if _pool is None or getattr(_pool, "_broken", False):
+            _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def get_properties(smiles, properties):
+    """
+    The selected PROPERTIES for one SMILES, computed in a single pass over one
+    MoleculeContext: only the descriptors those properties need are computed,
+    each once. A property whose predictor fails holds the error message.
+    """
+    ctx = _as_context(smiles)
+    try:
+        stored = lookup_descriptors(ctx)
+    except Exception:
+        stored = None
+    result = {"smiles": ctx.smiles}
+    for prop in properties:
+        if stored is not None:
+            result[prop] = stored[prop]
+            continue
+        try:
+            result[prop] = PREDICTORS[prop](ctx)
+        except Exception as e:
+            result[prop] = str(e)
+    return result
+
+def _select(properties):
+    # None (get_all_properties), a single property name, or a list of names
+    if properties is None:
+        return None
+    if isinstance(properties, str):
+        properties = [properties]
+    unknown = [prop for prop in properties if prop not in PREDICTORS]
+    if unknown:
+        raise ValueError(f"Unknown properties: {unknown}. Available: {PROPERTIES}")
+    return list(dict.fromkeys(properties))
+
+def _property_result(smiles, properties=None):
+    # Per-molecule error capture, same shapes as the bulk API has always returned
+    if properties is None:
+        try:
+            return _uncached_properties(_as_context(smiles))
+        except Exception as e:
+            return {"smiles": getattr(smiles, "smiles", smiles), "error": str(e)}
+    return get_properties(smiles, properties)
+
+def _compute_chunk(smiles_chunk, properties=None, cache_path=None):
+    # cache_path is passed explicitly so pool workers use the same property cache as the caller
+    cache = get_property_cache(cache_path) if cache_path else None
+    if cache is None:
+        return [_property_result(smiles, properties) for smiles in smiles_chunk]
+
+    # Spellings as given first, which needs no RDKit parse; the rest go to the
+    # descriptor store, then one more cache query under their _cache_keys
+    results = [None] * len(smiles_chunk)
+    for i, result in _known_results(smiles_chunk, properties, cache).items():
+        results[i] = result
+    pending = {}    # position -> (MoleculeContext, cache keys)
+    for i, smiles in enumerate(smiles_chunk):
+        if results[i] is not None:
+            continue
+        try:
+            ctx = _as_context(smiles)
+            stored = lookup_descriptors(ctx)
+            if stored is not None:
+                results[i] = _stored_result(ctx.smiles, stored, properties)
+            else:
+                pending[i] = (ctx, _cache_keys(ctx))
+        except Exception:
+            continue    # computed below, which reports the error
+    found = cache.get_many(key for _, keys in pending.values() for key in keys)
+
+    writes = []
+    for i, smiles in enumerate(smiles_chunk):
+        if results[i] is not None:
+            continue
+        ctx, keys = pending.get(i, (smiles, []))
+        stored = _first_cached(keys, found)
+        if stored is not None:
+            results[i] = _stored_result(ctx.smiles, stored, properties)
+        else:
+            results[i] = _property_result(ctx, properties)
+            stored = _cacheable(results[i], properties)
+        if stored is not None:
+            writes += [(key, stored) for key in keys if key not in found]
+    cache.put_many(writes)
+    return results
+
+def _known_results(smiles_chunk, properties, cache):
+    # {position: result} for inputs (strings or MoleculeContexts) whose spelling as given is
+    # in the property cache or the descriptor store; neither lookup parses the SMILES
+    spellings = {i: getattr(smiles, "smiles", smiles) for i, smiles in enumerate(smiles_chunk)}
+    spellings = {i: smiles.strip() for i, smiles in spellings.items() if isinstance(smiles, str)}
+    found = cache.get_many(spellings.values()) if cache is not None else {}
+    store = get_descriptor_store()
+    known = {}
+    for i, key in spellings.items():
+        stored = found.get(key)
+        if stored is None and store is not None:
+            pos = store.find(key)
+            stored = None if pos is None else store.properties(pos)
+        if stored is not None:
+            known[i] = _stored_result(getattr(smiles_chunk[i], "smiles", smiles_chunk[i]), stored, properties)
+    return known
+
+def _stored_result(smiles, stored, properties):
+    # A bulk result row from a stored {property: value} dict
+    if properties is None:
+        return {"smiles": smiles, **stored}
+    return {"smiles": smiles, **{prop: stored[prop] for prop in properties}}
+
+def _cacheable(result, properties):
+    # Only complete, error-free property sets go to the property cache
+    if properties is not None or "error" in result:
+        return None
+    return {prop: value for prop, value in result.items() if prop != "smiles"}
+
+def _canonical_chunk(smiles_chunk):
+    # Canonical SMILES per input, None where RDKit cannot parse it
+    return [MoleculeContext(smiles.strip()).canonical if isinstance(smiles, str) else None
+            for smiles in smiles_chunk]
+
+class _BatchPlan:
+    """
+    The distinct molecules of a bulk request. Repeated spellings are collapsed,
+    spellings already in the property cache or descriptor store are answered
+    directly, and the rest are grouped by canonical SMILES so each molecule is
+    computed once; fan_out() copies the results back to every input position.
+    """
+    def __init__(self, smiles_list, properties):
+        self.smiles_list = list(smiles_list)
+        self.properties = properties
+        self.spellings, self.spelling_of = [], []
+        positions = {}
+        for i, smiles in enumerate(self.smiles_list):
+            key = smiles.strip() if isinstance(smiles, str) else ("", i)
+            if key not in positions:
+                positions[key] = len(self.spellings)
+                self.spellings.append(smiles)
+            self.spelling_of.append(positions[key])
+        self.cache = get_property_cache()
+        self.results = [None] * len(self.spellings)     # per distinct spelling
+        for j, result in _known_results(self.spellings, properties, self.cache).items():
+            self.results[j] = result
+        self.unknown = [j for j, result in enumerate(self.results) if result is None]
+        self.molecule_of = {}
+
+    def unknown_spellings(self):
+        return [self.spellings[j] for j in self.unknown]
+
+    def molecules(self, canonical):
+        """The molecules to compute, given the canonical SMILES (or None) of each unknown spelling."""
+        positions, molecules = {}, []
+        for j, smiles in zip(self.unknown, canonical):
+            # Anything RDKit cannot parse is computed as given, so it reports its own result
+            key = smiles if smiles is not None else ("", j)
+            if key not in positions:
+                positions[key] = len(molecules)
+                molecules.append(MoleculeContext(smiles, smiles) if smiles is not None else self.spellings[j])
+            self.molecule_of[j] = positions[key]
+        return molecules
+
+    def fan_out(self, computed):
+        """Results in input order, each under the SMILES it was requested with."""
+        aliases = []
+        for j, m in self.molecule_of.items():
+            self.results[j] = computed[m]
+            stored = _cacheable(computed[m], self.properties)
+            if stored is not None and self.spellings[j].strip() != computed[m]["smiles"].strip():
+                aliases.append((self.spellings[j].strip(), stored))
+        if self.cache is not None:
+            # Lets this spelling skip the parse next time
+            self.cache.put_many(aliases)
+        return [{**self.results[j], "smiles": smiles} for smiles, j in zip(self.smiles_list, self.spelling_of)]
+
+def _map_chunks(fn, items, chunksize, *args):
+    # fn over chunks of items, in-process for a single chunk, otherwise in the pool; flattened in order
+    if len(items) <= chunksize:
+        return fn(items, *args)
+    pool = get_pool()
+    futures = [pool.submit(fn, items[i:i + chunksize], *args) for i in range(0, len(items), chunksize)]
+    return [result for future in futures for result in future.result()]
+
+async def _map_chunks_async(fn, items, chunksize, *args):
+    if len(items) <= chunksize:
+        return await asyncio.get_running_loop().run_in_executor(None, fn, items, *args)
+    pool = get_pool()
+    chunks = await asyncio.gather(*(asyncio.wrap_future(pool.submit(fn, items[i:i + chunksize], *args))
+                                    for i in range(0, len(items), chunksize)))
+    return [result for chunk in chunks for result in chunk]
+
+def submit_batch(smiles_list, properties=None, chunksize=BATCH_CHUNKSIZE):
+    """
+    Submits smiles_list to the shared pool in chunks; returns one future per chunk, in order.
+    properties is a name or list of names from PROPERTIES, or None for get_all_properties.
+    """
+    properties = _select(properties)
+    pool = get_pool()
+    return [pool.submit(_compute_chunk, smiles_list[i:i + chunksize], properties, PROPERTY_CACHE)
+            for i in range(0, len(smiles_list), chunksize)]
+
+def batch_properties(smiles_list, properties=None, chunksize=BATCH_CHUNKSIZE):
+    """
+    Computes the selected (or all) properties for every SMILES, results in input order.
+    Each distinct molecule is computed once, however many times and spellings it
+    appears in. Lists no longer than one chunk are computed in-process.
+    """
+    plan = _BatchPlan(smiles_list, _select(properties))
+    canonical = _map_chunks(_canonical_chunk, plan.unknown_spellings(), chunksize)
+    computed = _map_chunks(_compute_chunk, plan.molecules(canonical), chunksize, plan.properties, PROPERTY_CACHE)
+    return plan.fan_out(computed)
+
+async def batch_properties_async(smiles_list, properties=None, chunksize=BATCH_CHUNKSIZE):
+    """batch_properties for async callers; never blocks the event loop."""
+    properties = _select(properties)
+    plan = await asyncio.get_running_loop().run_in_executor(None, _BatchPlan, smiles_list, properties)
+    canonical = await _map_chunks_async(_canonical_chunk, plan.unknown_spellings(), chunksize)
+    computed = await _map_chunks_async(_compute_chunk, plan.molecules(canonical), chunksize, properties,
+                                       PROPERTY_CACHE)
+    return plan.fan_out(computed)
+
+async def stream_batch_properties(smiles_source, properties=None, chunksize=64, max_pending=None):
+    """
+    Async generator of batch results for a plain or async iterable of SMILES, in
+    input order. Chunks go to the pool as input arrives and finished chunks are
+    yielded right away; at most max_pending chunks are in flight, so a slow
+    consumer also stops input being read and computed.
+    """
+    properties = _select(properties)
+    if not hasattr(smiles_source, "__aiter__"):
+        smiles_source = _as_async_iter(smiles_source)
+    max_pending = max_pending or 2 * (os.cpu_count() or 1)
+    pool = get_pool()
+    pending = collections.deque()
+    chunk = []
+
+    async for smiles in smiles_source:
+        chunk.append(smiles)
+        if len(chunk) < chunksize:
+            continue
+        pending.append(asyncio.wrap_future(pool.submit(_compute_chunk, chunk, properties, PROPERTY_CACHE)))
+        chunk = []
+        while pending and (pending[0].done() or len(pending) >= max_pending):
+            for result in await pending.popleft():
+                yield result
+
+    if chunk:
+        pending.append(asyncio.wrap_future(pool.submit(_compute_chunk, chunk, properties, PROPERTY_CACHE)))
+    while pending:
+        for result in await pending.popleft():
+            yield result
+
+async def _as_async_iter(items):
+    for item in items:
+        yield item
+
+# Offline descriptor store: every PROPERTIES predictor run once over ZINC and
+# saved as memory-mapped .npy columns keyed by sorted canonical SMILES.
+DESCRIPTOR_STORE = "zinc_descriptors"  # directory written by build_descriptor_store.py
+PREDICTOR_VERSION = 2                  # bump when a predictor changes to invalidate stored values
+                                       # (2: ZINC rows are also matched by canonical SMILES)
+
+# How each property is encoded: float64 (NaN = None), int8 bool / category codes (-1 = None),
+# or not stored at all because the predictor always returns None
+STORE_COLUMNS = {
+    "toxicity": "float",
+    "solubility": "float",
+    "bioactivity": "bool",
+    "permeability": "float",
+    "logP": "float",
+    "stability": ["low", "medium", "high"],
+    "binding_affinity": "float",
+    "mutagenicity": "bool",
+    "toxicological_endpoints": "none",
+    "custom_hmpi": "float"
+}
+
+def _replace_file(path, write):
+    # write(f) into a temp file beside path, then os.replace it into place. Readers that
+    # have the old file memory-mapped keep its inode; overwriting in place truncates it under them.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _save_npy(path, array):
+    _replace_file(path, lambda f: np.save(f, array))
+
+def _save_meta(path, meta):
+    _replace_file(path, lambda f: f.write(json.dumps(meta, indent=4).encode("utf-8")))
+
+class DescriptorStore:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.columns = {prop: np.load(os.path.join(path, f"{prop}.npy"), mmap_mode="r")
+                        for prop, kind in self.meta["columns"].items() if kind != "none"}
+
+    def find(self, smiles):
+        """Row position of a canonical SMILES, or None."""
+        key = smiles.encode()
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return pos
+        return None
+
+    def properties(self, pos):
+        result = {}
+        for prop, kind in self.meta["columns"].items():
+            if kind == "none":
+                result[prop] = None
+                continue
+            value = self.columns[prop][pos]
+            if kind == "float":
+                result[prop] = None if np.isnan(value) else float(value)
+            elif value < 0:
+                result[prop] = None
+            elif kind == "bool":
+                result[prop] = bool(value)
+            else:
+                result[prop] = kind[value]
+        return result
+
+_store_lock = threading.Lock()
+_store = None
+_store_stamp = None
+
+def get_descriptor_store():
+    """
+    Returns the DescriptorStore at DESCRIPTOR_STORE, loading it on first use and
+    again whenever it is rebuilt. None if there is no store for PREDICTOR_VERSION.
+    """
+    global _store, _store_stamp
+    try:
+        stat = os.stat(os.path.join(DESCRIPTOR_STORE, "meta.json"))
+    except OSError:
+        return None
+    stamp = (DESCRIPTOR_STORE, stat.st_mtime_ns, stat.st_size)
+    if stamp != _store_stamp:
+        with _store_lock:
+            if stamp != _store_stamp:
+                store = DescriptorStore(DESCRIPTOR_STORE)
+                _store = store if store.meta.get("version") == PREDICTOR_VERSION else None
+                _store_stamp = stamp
+    return _store
+
+def lookup_descriptors(smiles):
+    """
+    Stored properties for a SMILES string or MoleculeContext, or None if the
+    molecule is not in the descriptor store. The input is tried as-is first, so
+    canonical SMILES are found without an RDKit parse.
+    """
+    store = get_descriptor_store()
+    if store is None:
+        return None
+    ctx = _as_context(smiles)
+    pos = store.find(ctx.smiles.strip())
+    if pos is None and ctx.canonical is not None:
+        pos = store.find(ctx.canonical)
+    return None if pos is None else store.properties(pos)
+
+# Property cache: results for molecules outside the descriptor store, kept in an
+# SQLite file so they survive restarts and are shared by every worker process.
+PROPERTY_CACHE = "property_cache.sqlite"   # None disables the cache
+
+class PropertyCache:
+    """
+    get_all_properties results (without "smiles") keyed by SMILES spelling and
+    predictor version. Lookups take one query per batch of keys; writes are
+    queued to a background thread that commits them in batches. WAL mode lets
+    several processes read and write the same file.
+    """
+    def __init__(self, path, version=PREDICTOR_VERSION):
+        self.path = path
+        self.version = version
+        self._local = threading.local()     # one connection per thread
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS properties (smiles TEXT NOT NULL, version INTEGER NOT NULL, "
+                         "value TEXT NOT NULL, PRIMARY KEY (smiles, version)) WITHOUT ROWID")
+            conn.execute("DELETE FROM properties WHERE version < ?", (version,))
+        # Pending writes are flushed at exit, in pool workers too
+        multiprocessing.util.Finalize(None, self.flush, exitpriority=10)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys, batch_size=500):
+        """{key: properties} for the keys that are cached."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        conn = self._connect()
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            rows = conn.execute(f"SELECT smiles, value FROM properties WHERE version = ? AND smiles IN "
+                                f"({', '.join('?' * len(batch))})", (self.version, *batch))
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put_many(self, items):
+        """Queues (key, properties) pairs to be written in the background."""
+        items = [(key, self.version, json.dumps(value)) for key, value in items]
+        if not items:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="property-cache", daemon=True)
+                self._writer.start()
+        self._queue.put(items)
+
+    def _write_loop(self):
+        while True:
+            items, batches = self._queue.get(), 1
+            while True:
+                try:
+                    items += self._queue.get_nowait()
+                    batches += 1
+                except queue.Empty:
+                    break
+            try:
+                with self._connect() as conn:
+                    conn.executemany("INSERT OR REPLACE INTO properties (smiles, version, value) VALUES (?, ?, ?)",
+                                     items)
+            except sqlite3.Error:
+                pass    # the cache is best-effort; the values are simply computed again
+            finally:
+                for _ in range(batches):
+                    self._queue.task_done()
+
+    def flush(self):
+        """Waits until every queued write is committed."""
+        self._queue.join()
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM properties WHERE version = ?",
+                                       (self.version,)).fetchone()[0]
+
+_property_caches = {}
+_property_cache_lock = threading.Lock()
+
+def get_property_cache(path=None):
+    """
+    The PropertyCache at path (default PROPERTY_CACHE) for PREDICTOR_VERSION.
+    None when disabled or when the file cannot be opened.
+    """
+    path = path or PROPERTY_CACHE
+    if not path:
+        return None
+    key = (path, PREDICTOR_VERSION)
+    if key not in _property_caches:
+        with _property_cache_lock:
+            if key not in _property_caches:
+                try:
+                    _property_caches[key] = PropertyCache(path, PREDICTOR_VERSION)
+                except sqlite3.Error:
+                    _property_caches[key] = None
+    return _property_caches[key]
+
+def _cache_keys(ctx):
+    # The spelling as given and the canonical SMILES. The ZINC index resolves every spelling of a
+    # molecule to the same row (see _read_zinc), so every spelling gets the same values
+    return [key for key in dict.fromkeys((ctx.smiles.strip(), ctx.canonical)) if key]
+
+def _first_cached(keys, found):
+    return next((found[key] for key in keys if key in found), None)
+
+def _store_chunk(smiles_chunk):
+    rows = []
+    for smiles in smiles_chunk:
+        ctx = MoleculeContext(smiles)
+        try:
+            if ctx.mol is None:
+                continue
+            rows.append((ctx.canonical, smiles.strip(), _live_properties(ctx)))
+        except Exception:
+            continue
+    return rows
+
+def _encode(values, kind):
+    if kind == "float":
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if kind == "bool":
+        return np.array([-1 if v is None else int(v) for v in values], dtype=np.int8)
+    return np.array([-1 if v is None else kind.index(v) for v in values], dtype=np.int8)
+
+def build_descriptor_store(path=DESCRIPTOR_STORE, smiles_list=None, chunksize=2048):
+    """
+    Runs every PROPERTIES predictor once over the ZINC dataset (or smiles_list)
+    and writes the descriptor store to path. Returns the number of molecules stored.
+    """
+    if smiles_list is None:
+        smiles_list = load_smiles()
+    chunks = [smiles_list[i:i + chunksize] for i in range(0, len(smiles_list), chunksize)]
+    if len(chunks) > 1:
+        rows = [row for chunk in get_pool().map(_store_chunk, chunks) for row in chunk]
+    else:
+        rows = [row for chunk in chunks for row in _store_chunk(chunk)]
+
+    # One entry per canonical SMILES (first occurrence), plus the dataset's own
+    # spelling when it differs so those lookups never need a parse; sorted for binary search
+    unique = {}
+    molecules = len({canonical for canonical, _, _ in rows})
+    for canonical, raw, props in rows:
+        unique.setdefault(canonical, props)
+        unique.setdefault(raw, props)
+    keys = np.array([k.encode() for k in unique], dtype=bytes)
+    values = list(unique.values())
+    order = np.argsort(keys, kind="stable")
+    props = [values[i] for i in order]
+
+    os.makedirs(path, exist_ok=True)
+    _save_npy(os.path.join(path, "keys.npy"), keys[order])
+    for prop, kind in STORE_COLUMNS.items():
+        if kind != "none":
+            _save_npy(os.path.join(path, f"{prop}.npy"), _encode([p[prop] for p in props], kind))
+    # meta.json is written last; its change is what makes running services reload
+    _save_meta(os.path.join(path, "meta.json"), {"version": PREDICTOR_VERSION, "source": ZINC_LOCAL,
+                                                 "molecules": molecules, "keys": len(keys),
+                                                 "columns": STORE_COLUMNS})
+    return molecules
+
+# Similarity index: Morgan fingerprints of the ZINC molecules packed into uint64
+# words, memory-mapped from .npy files and scanned with vectorized Tanimoto.
+FINGERPRINT_INDEX = "zinc_fingerprints"  # directory written by build_fingerprint_index.py
+FINGERPRINT_RADIUS = 2
+FINGERPRINT_BITS = 2048
+
+if hasattr(np, "bitwise_count"):
+    def _row_popcount(words):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint16)
+else:  # numpy < 2: per-byte lookup table
+    _BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _row_popcount(words):
+        return _BYTE_POPCOUNT[np.ascontiguousarray(words).view(np.uint8)].sum(axis=1, dtype=np.uint16)
+
+@lru_cache(maxsize=None)
+def _morgan_generator(radius, n_bits):
+    from rdkit.Chem import rdFingerprintGenerator
+    return rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+
+def morgan_fingerprint(smiles, radius=FINGERPRINT_RADIUS, n_bits=FINGERPRINT_BITS):
+    """
+    Morgan fingerprint of a SMILES string or MoleculeContext as n_bits / 64
+    packed uint64 words, or None if RDKit cannot parse it.
+    """
+    ctx = _as_context(smiles)
+    if ctx.mol is None:
+        return None
+    bits = _morgan_generator(radius, n_bits).GetFingerprintAsNumPy(ctx.mol)
+    return np.packbits(bits).view(np.uint64)
+
+class FingerprintIndex:
+    """
+    Packed fingerprints of a molecule set. Rows are sorted by bit count, so a
+    similarity threshold t only needs the rows whose count c satisfies
+    t * q <= c <= q / t for a query with q bits (Tanimoto <= min / max count).
+    """
+    BLOCK = 16384   # rows per vectorized step; keeps the temporaries in cache
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.radius = self.meta["radius"]
+        self.n_bits = self.meta["n_bits"]
+        self.fingerprints = np.load(os.path.join(path, "fingerprints.npy"), mmap_mode="r")
+        self.counts = np.load(os.path.join(path, "counts.npy"), mmap_mode="r")
+        self.smiles = np.load(os.path.join(path, "smiles.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.counts)
+
+    def search(self, query, k=10, min_similarity=0.0):
+        """
+        (positions, similarities) of the k rows most similar to a packed query
+        fingerprint with similarity >= min_similarity, most similar first.
+        """
+        q_count = int(_row_popcount(query[None])[0])
+        lo, hi = 0, len(self)
+        if min_similarity > 0:
+            lo = int(np.searchsorted(self.counts, math.ceil(q_count * min_similarity - 1e-9), side="left"))
+            hi = int(np.searchsorted(self.counts, math.floor(q_count / min_similarity + 1e-9), side="right"))
+        similarities = np.zeros(max(hi - lo, 0), dtype=np.float64)
+        buffer = np.empty((min(self.BLOCK, len(similarities)), self.fingerprints.shape[1]), dtype=np.uint64)
+        for start in range(lo, hi, self.BLOCK):
+            stop = min(start + self.BLOCK, hi)
+            block = buffer[:stop - start]
+            np.bitwise_and(self.fingerprints[start:stop], query, out=block)
+            common = _row_popcount(block)
+            union = q_count + self.counts[start:stop].astype(np.int32) - common
+            similarities[start - lo:stop - lo] = common / np.maximum(union, 1)
+
+        candidates = np.flatnonzero(similarities >= min_similarity)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-similarities[candidates], k - 1)[:k]]
+        # Most similar first, ties in index order
+        candidates = candidates[np.lexsort((candidates, -similarities[candidates]))]
+        return candidates + lo, similarities[candidates]
+
+    def similar(self, smiles, k=10, min_similarity=0.0):
+        """[{"smiles", "similarity"}, ...] for search() on a SMILES; ValueError if it cannot be parsed."""
+        try:
+            query = morgan_fingerprint(smiles, self.radius, self.n_bits)
+        except Exception:
+            query = None
+        if query is None:
+            raise ValueError(f"Invalid SMILES: {smiles!r}")
+        positions, similarities = self.search(query, k, min_similarity)
+        return [{"smiles": self.smiles[pos].decode(), "similarity": round(float(sim), 4)}
+                for pos, sim in zip(positions.tolist(), similarities.tolist())]
+
+_fp_lock = threading.Lock()
+_fp_index = None
+_fp_stamp = None
+
+def get_fingerprint_index(path=None):
+    """
+    Returns the FingerprintIndex at path (default FINGERPRINT_INDEX), loading it
+    on first use and again whenever it is rebuilt. None if it has not been built.
+    """
+    global _fp_index, _fp_stamp
+    path = path or FINGERPRINT_INDEX
+    try:
+        stat = os.stat(os.path.join(path, "meta.json"))
+    except OSError:
+        return None
+    stamp = (path, stat.st_mtime_ns, stat.st_size)
+    if stamp != _fp_stamp:
+        with _fp_lock:
+            if stamp != _fp_stamp:
+                _fp_index = FingerprintIndex(path)
+                _fp_stamp = stamp
+    return _fp_index
+
+def _require_fingerprint_index():
+    index = get_fingerprint_index()
+    if index is None:
+        raise FileNotFoundError(f"No similarity index at {FINGERPRINT_INDEX}. Run build_fingerprint_index.py first.")
+    return index
+
+def similar_molecules(smiles, k=10, min_similarity=0.0):
+    """
+    The k indexed molecules most similar to a SMILES (Tanimoto similarity of
+    Morgan fingerprints) as [{"smiles", "similarity"}, ...], most similar first.
+    Raises FileNotFoundError without an index, ValueError for an invalid SMILES.
+    """
+    return _require_fingerprint_index().similar(smiles, k, min_similarity)
+
+def _similarity_chunk(smiles_chunk, k, min_similarity, index_path):
+    # index_path is passed explicitly so pool workers scan the same index as the caller
+    index = get_fingerprint_index(index_path)
+    results = []
+    for smiles in smiles_chunk:
+        try:
+            results.append({"smiles": smiles, "results": index.similar(smiles, k, min_similarity)})
+        except Exception as e:
+            results.append({"smiles": smiles, "error": str(e)})
+    return results
+
+def similar_molecules_batch(smiles_list, k=10, min_similarity=0.0, chunksize=16):
+    """
+    similar_molecules for many queries, in input order; a query that fails holds
+    "error" instead of "results". Lists longer than chunksize are scanned in the
+    process pool, chunksize queries per task, so every core scans the shared mmap.
+    """
+    _require_fingerprint_index()
+    return _map_chunks(_similarity_chunk, list(smiles_list), chunksize, k, min_similarity, FINGERPRINT_INDEX)
+
+async def similar_molecules_batch_async(smiles_list, k=10, min_similarity=0.0, chunksize=16):
+    """similar_molecules_batch for async callers; never blocks the event loop."""
+    _require_fingerprint_index()
+    return await _map_chunks_async(_similarity_chunk, list(smiles_list), chunksize, k, min_similarity,
+                                   FINGERPRINT_INDEX)
+
+def _fingerprint_chunk(smiles_chunk, radius, n_bits):
+    # Positions of the SMILES RDKit can parse, and their packed fingerprints
+    rows, fingerprints = [], []
+    for i, smiles in enumerate(smiles_chunk):
+        try:
+            fp = morgan_fingerprint(smiles, radius, n_bits)
+        except Exception:
+            continue
+        if fp is not None:
+            rows.append(i)
+            fingerprints.append(fp)
+    return rows, np.array(fingerprints, dtype=np.uint64).reshape(len(fingerprints), n_bits // 64)
+
+def build_fingerprint_index(path=FINGERPRINT_INDEX, smiles_list=None, radius=FINGERPRINT_RADIUS,
+                            n_bits=FINGERPRINT_BITS, chunksize=4096):
+    """
+    Computes the Morgan fingerprint of every molecule in the ZINC dataset (or
+    smiles_list) and writes the similarity index to path. Returns the number of
+    molecules indexed.
+    """
+    if n_bits <= 0 or n_bits % 64:
+        raise ValueError("n_bits must be a positive multiple of 64")
+    if smiles_list is None:
+        smiles_list = load_smiles()
+    chunks = [smiles_list[i:i + chunksize] for i in range(0, len(smiles_list), chunksize)]
+    if len(chunks) > 1:
+        parts = list(get_pool().map(_fingerprint_chunk, chunks, [radius] * len(chunks), [n_bits] * len(chunks)))
+    else:
+        parts = [_fingerprint_chunk(chunk, radius, n_bits) for chunk in chunks]
+    smiles = [chunk[i].strip() for chunk, (rows, _) in zip(chunks, parts) for i in rows]
+    fingerprints = np.concatenate([fps for _, fps in parts] or [np.empty((0, n_bits // 64), dtype=np.uint64)])
+
+    # Sorted by bit count for the threshold bounds in FingerprintIndex.search
+    counts = _row_popcount(fingerprints)
+    order = np.argsort(counts, kind="stable")
+    os.makedirs(path, exist_ok=True)
+    _save_npy(os.path.join(path, "fingerprints.npy"), fingerprints[order])
+    _save_npy(os.path.join(path, "counts.npy"), counts[order])
+    _save_npy(os.path.join(path, "smiles.npy"), np.array([s.encode() for s in smiles], dtype=bytes)[order])
+    # meta.json is written last; its change is what makes running services reload
+    _save_meta(os.path.join(path, "meta.json"), {"fingerprint": "morgan", "radius": radius, "n_bits": n_bits,
+                                                 "source": ZINC_LOCAL, "molecules": len(smiles)})
+    return len(smiles)
+
+
+def warm():
+    """
+    Does the work otherwise deferred to the first request: imports pandas and
+    RDKit, and loads the ZINC table, the descriptor store and the similarity
+    index when present.
+    """
+    for module in _LAZY_MODULES.values():
+        importlib.import_module(module)
+    if os.path.exists(ZINC_LOCAL):
+        get_zinc_table()
+    get_descriptor_store()
+    get_fingerprint_index()
+
+def warm_in_background():
+    """Runs warm() in a daemon thread, so a service can accept requests meanwhile."""
+    thread = threading.Thread(target=warm, name="dci-warm", daemon=True)
+    thread.start()
+    return thread
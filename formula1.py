@@ -1,69 +1,104 @@
 # === formulae registry ===
+import numpy as np
 import pandas as pd
+from formula_registry import FORMULA1
+from standards import Standards, get_standards
 
 def calculate_indices(df):
-    # Always work on a copy
-    df = df.copy()
+    """
+    HPI, HEI and Cd of one sample, evaluated by formula_registry.FORMULA1: rows
+    with Si <= 0 or missing are dropped, and a sample without valid rows gives
+    (nan, 0.0, 0.0).
+    """
+    columns = {col: pd.to_numeric(df[col], errors="coerce") for col in ["Ci", "Si", "Ii", "MACi"]}
+    values = FORMULA1.evaluate_sample(columns)
+    return values["HPI"], values["HEI"], values["Cd"]
 
-    # Ensure numeric conversion
-    for col in ["Ci", "Si", "Ii", "MACi"]:
-        df.loc[:, col] = pd.to_numeric(df[col], errors="coerce")
+def calculate_indices_batch(df, sample_col="SampleID", standards=None):
+    """
+    Vectorised calculate_indices for a long-format table holding many samples.
+    Returns a DataFrame indexed by sample_col with a column per index of
+    formula_registry.FORMULA1 (HPI, HEI and Cd), matching what
+    calculate_indices gives for each sample on its own.
+    Si, Ii and MACi come from the standards version (a name or a Standards)
+    when one is given or when the table has no such columns.
+    """
+    codes, samples = pd.factorize(df[sample_col], sort=True)
 
-    # Drop rows where Si <= 0 or missing
-    df = df[df["Si"] > 0].copy()
+    # Ensure numeric conversion (once for the whole table)
+    ci = pd.to_numeric(df["Ci"], errors="coerce").to_numpy(dtype=float)
 
-    if df.empty:
-        return float("nan"), 0.0, 0.0   # no valid data
+    # Drop rows without a sample key; the registry drops rows where Si <= 0 or missing
+    keep = codes >= 0
+    if standards is not None or not {"Si", "Ii", "MACi"} <= set(df.columns):
+        if not isinstance(standards, Standards):
+            standards = get_standards(standards)
+        parameters = standards.codes(df["ParameterName"])
+        values = standards.evaluate(FORMULA1, codes[keep], len(samples), parameters[keep], ci[keep])
+    else:
+        columns = {col: pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) for col in ["Si", "Ii", "MACi"]}
+        columns["Ci"] = ci
+        values = FORMULA1.evaluate(codes[keep], len(samples), {col: v[keep] for col, v in columns.items()})
 
-    # Qi
-    df["Qi"] = ((df["Ci"] - df["Ii"]) / (df["Si"] - df["Ii"])) * 100
+    return pd.DataFrame(values, index=pd.Index(samples, name=sample_col))
 
-    # Wi
-    denom = (1 / df["Si"]).sum()
-    if denom == 0:
-        return float("nan"), 0.0, 0.0
+def categorize_indices(HPI, HEI, Cd):
+    """
+    Category of each index and the overall conclusion, from the thresholds and
+    rules declared in FORMULA1_SPEC.
+    """
+    categories = FORMULA1.categorize_sample({"HPI": HPI, "HEI": HEI, "Cd": Cd})
+    return categories["HPI_Category"], categories["HEI_Category"], categories["Cd_Category"], categories["OverallConclusion"]
 
-    df["Wi"] = (1 / df["Si"]) / denom
+def categorize_indices_batch(indices):
+    """
+    Vectorised categorize_indices for the frame returned by calculate_indices_batch.
+    """
+    categories = FORMULA1.categorize({name: indices[name].to_numpy(dtype=float) for name in FORMULA1.indices})
+    return pd.DataFrame(categories, index=indices.index)
 
-    # Indices
-    HPI = (df["Qi"] * df["Wi"]).sum() / df["Wi"].sum()
-    HEI = (df["Ci"] / df["Si"]).sum()
-    Cd = (df["Ci"] / df["MACi"]).sum()
+def results_frame(indices):
+    """
+    Joins calculate_indices_batch output with its categories into the flat
+    result layout used for output.json (values rounded to 2 decimals).
+    """
+    results = indices.round(2).join(categorize_indices_batch(indices)).reset_index()
+    return results[[indices.index.name, "HPI", "HPI_Category", "HEI", "HEI_Category",
+                    "Cd", "Cd_Category", "OverallConclusion"]]
 
-    return HPI, HEI, Cd
+def iter_indices_csv(path, chunksize=100_000, sample_col="SampleID", check_contiguous=False):
+    """
+    Streams a long-format CSV in chunks and yields results_frame output for
+    every sample as soon as all of its rows have been read.
+    Rows of one sample must be contiguous in the file; the sample at the end of
+    a chunk is carried over and finished together with the next chunk. Memory
+    is bounded by chunksize. check_contiguous=True raises ValueError for a
+    sample that reappears after another one, at the cost of remembering every
+    SampleID seen.
+    """
+    carry = None
+    seen = set()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
 
-def categorize_indices(HPI, HEI, Cd):
-    # HPI
-    if HPI < 100:
-        hpi_cat = "safe"
-    elif HPI < 200:
-        hpi_cat = "caution"
-    else:
-        hpi_cat = "unsafe"
+        ids = chunk[sample_col].to_numpy()
+        if check_contiguous:
+            runs = ids[np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])]
+            for sample in runs:
+                if sample in seen:
+                    raise ValueError(f"{sample_col} {sample!r} reappears after other samples; "
+                                     "rows of one sample must be contiguous")
+                seen.add(sample)
+            seen.discard(runs[-1])  # still open, continues in the next chunk
 
-    # HEI
-    if HEI < 10:
-        hei_cat = "low pollution"
-    elif HEI < 20:
-        hei_cat = "medium"
-    else:
-        hei_cat = "high"
-
-    # Cd
-    if Cd < 1:
-        cd_cat = "low contamination"
-    elif Cd < 3:
-        cd_cat = "medium"
-    else:
-        cd_cat = "high"
-
-    # Precise conclusion
-    if hpi_cat == "unsafe" or cd_cat == "high":
-        conclusion = "Unsafe"
-    elif hpi_cat == "caution" or cd_cat == "medium":
-        conclusion = "Moderate / Caution"
-    else:
-        conclusion = "Safe"
+        # Split off the trailing run of the last SampleID
+        other = np.flatnonzero(ids != ids[-1])
+        split = other[-1] + 1 if len(other) else 0
 
-    return hpi_cat, hei_cat, cd_cat, conclusion
+        carry = chunk.iloc[split:]
+        if split:
+            yield results_frame(calculate_indices_batch(chunk.iloc[:split], sample_col))
 
+    if carry is not None and not carry.empty:
+        yield results_frame(calculate_indices_batch(carry, sample_col))
@@ -0,0 +1,397 @@
+"""
+Formula registry: water quality indices declared as data and compiled once into
+vectorised NumPy expressions over long-format batches (one row per parameter).
+
+A registry spec is a JSON-compatible dict:
+
+    where       optional row filter, e.g. "Si > 0"
+    terms       per-parameter expressions, e.g. {"Cfi": "Ci / Si"}
+    valid       optional per-sample condition; indices of other samples are
+                replaced by their "invalid" value (NaN by default)
+    indices     {name: {"expr", "thresholds", "labels", "invalid"}}
+    conclusion  [[label, {index: [categories]}], ...], first match wins and a
+                rule without conditions is the default
+
+Expressions use the columns Ci, Si, Ii, MACi, the terms, earlier indices,
+numbers, + - * / ** < <= > >= == != & |, the per-sample aggregates sum, mean,
+max, min and count (which skip NaN like the pandas reductions) and the
+elementwise sqrt, abs and log10. Per-sample values used in a per-parameter
+expression are broadcast back to the sample's rows, so "(1 / Si) / sum(1 / Si)"
+is a weight. Every index of a registry is evaluated in the same pass, and
+identical subexpressions are computed once per batch.
+"""
+import ast
+import json
+import numpy as np
+
+COLUMNS = ("Ci", "Si", "Ii", "MACi")
+# Columns that only depend on the parameter (see parameter_constants)
+STANDARD_COLUMNS = ("Si", "Ii", "MACi")
+
+FUNCTIONS = {"sqrt": np.sqrt, "abs": np.abs, "log10": np.log10}
+
+BINARY_OPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.Pow: np.power, ast.BitAnd: np.logical_and, ast.BitOr: np.logical_or,
+}
+COMPARE_OPS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+
+# Result levels of an expression, broadcast upwards: constants < per-sample < per-row
+SCALAR, SAMPLE, ROW = 0, 1, 2
+
+CONCLUSION = [
+    ["Unsafe", {"HPI": ["unsafe"], "Cd": ["high"]}],
+    ["Moderate / Caution", {"HPI": ["caution"], "Cd": ["medium"]}],
+    ["Safe", {}],
+]
+
+# Indices of formula1.py: rows with Si <= 0 are dropped
+FORMULA1_SPEC = {
+    "where": "Si > 0",
+    "valid": "(count(Si) > 0) & (sum(1 / Si) != 0)",
+    "terms": {"Qi": "((Ci - Ii) / (Si - Ii)) * 100", "Wi": "(1 / Si) / sum(1 / Si)"},
+    "indices": {
+        "HPI": {"expr": "sum(Qi * Wi) / sum(Wi)", "thresholds": [100, 200], "labels": ["safe", "caution", "unsafe"]},
+        "HEI": {"expr": "sum(Ci / Si)", "invalid": 0.0,
+                "thresholds": [10, 20], "labels": ["low pollution", "medium", "high"]},
+        "Cd": {"expr": "sum(Ci / MACi)", "invalid": 0.0,
+               "thresholds": [1, 3], "labels": ["low contamination", "medium", "high"]},
+    },
+    "conclusion": CONCLUSION,
+}
+
+# Indices of formulae.py (used by the API): HEI over MACi, Cd as the contamination degree
+FORMULAE_SPEC = {
+    "terms": {"Qi": "((Ci - Ii) / (Si - Ii)) * 100", "Wi": "(1 / Si) / sum(1 / Si)", "Cfi": "Ci / Si"},
+    "indices": {
+        "HPI": {"expr": "sum(Qi * Wi) / sum(Wi)", "thresholds": [100, 200], "labels": ["safe", "caution", "unsafe"]},
+        "HEI": {"expr": "sum(Ci / MACi)", "thresholds": [10, 20], "labels": ["low pollution", "medium", "high"]},
+        "Cd": {"expr": "sum(Cfi - 1)", "thresholds": [1, 3], "labels": ["low contamination", "medium", "high"]},
+    },
+    "conclusion": CONCLUSION,
+}
+
+# Further indices that can be added to any registry with add_index(name, **INDEX_LIBRARY[name])
+INDEX_LIBRARY = {
+    # Metal index
+    "MI": {"expr": "sum(Ci / MACi)", "thresholds": [0.3, 1, 2, 4, 6],
+           "labels": ["very pure", "pure", "slightly affected", "moderately affected", "strongly affected",
+                      "seriously affected"]},
+    # Nemerow pollution index over the single factor indices Ci / Si
+    "PN": {"expr": "sqrt((max(Ci / Si) ** 2 + mean(Ci / Si) ** 2) / 2)", "thresholds": [0.7, 1, 2, 3],
+           "labels": ["clean", "warning", "slight", "moderate", "heavy"]},
+}
+
+
+class _Batch:
+    # Evaluation state of one batch: rows are already filtered. parameters gives
+    # each row's parameter code into the per-parameter constants tables
+    def __init__(self, codes, n_samples, columns, parameters=None, constants=None):
+        self.codes = codes
+        self.n_samples = n_samples
+        self.values = dict(columns)
+        self.cache = {}
+        self.parameters = parameters
+        self.constants = constants if parameters is not None and constants else {}
+
+    def group_sum(self, values):
+        values = np.asarray(values, dtype=float)
+        return np.bincount(self.codes, weights=np.where(np.isnan(values), 0.0, values), minlength=self.n_samples)
+
+    def group_count(self, values):
+        return np.bincount(self.codes, weights=~np.isnan(np.asarray(values, dtype=float)), minlength=self.n_samples)
+
+    def group_extreme(self, values, ufunc, start):
+        values = np.asarray(values, dtype=float)
+        out = np.full(self.n_samples, start)
+        ufunc.at(out, self.codes, values)  # fmax / fmin skip NaN
+        out[self.group_count(values) == 0] = np.nan
+        return out
+
+
+AGGREGATES = ("sum", "mean", "max", "min", "count")
+
+def _aggregate(name, batch, values):
+    if name == "sum":
+        return batch.group_sum(values)
+    if name == "count":
+        return batch.group_count(values)
+    if name == "mean":
+        return batch.group_sum(values) / batch.group_count(values)
+    if name == "max":
+        return batch.group_extreme(values, np.fmax, -np.inf)
+    return batch.group_extreme(values, np.fmin, np.inf)
+
+
+def compile_expression(expr, levels, constant_names=STANDARD_COLUMNS, constants=None):
+    """
+    Compiles an expression string into (level, fn), where fn(batch) returns its
+    values. levels maps every name the expression may use to ROW or SAMPLE.
+    Per-parameter subexpressions that only use constant_names are also added to
+    the constants dict, when given, keyed like the batch cache.
+    Raises ValueError for unknown names or unsupported syntax.
+    """
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression '{expr}': {e.msg}")
+    return _compile(tree.body, levels, expr, (set(constant_names), constants))
+
+def _is_parameter_constant(node, constant_names):
+    # True if node only reads constant columns/terms and aggregates nothing
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id not in constant_names and child.id not in FUNCTIONS:
+            return False
+        if isinstance(child, ast.Call) and getattr(child.func, "id", None) in AGGREGATES:
+            return False
+    return True
+
+def _broadcast(level, fn):
+    # Wraps fn so its per-sample result is indexed out to rows
+    if level != SAMPLE:
+        return fn
+    return lambda batch: fn(batch)[batch.codes]
+
+def _cached(node, level, fn, constants):
+    key = ast.dump(node)
+    constant_names, collected = constants
+    if level == ROW and collected is not None and _is_parameter_constant(node, constant_names):
+        collected[key] = fn
+
+    def cached(batch):
+        if key not in batch.cache:
+            table = batch.constants.get(key)
+            batch.cache[key] = fn(batch) if table is None else table[batch.parameters]
+        return batch.cache[key]
+    return cached
+
+def _compile(node, levels, expr, constants):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return SCALAR, lambda batch: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in levels:
+            raise ValueError(f"Unknown name '{node.id}' in '{expr}'")
+        name = node.id
+        return levels[name], lambda batch: batch.values[name]
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        level, fn = _compile(node.operand, levels, expr, constants)
+        sign = -1.0 if isinstance(node.op, ast.USub) else 1.0
+        return level, _cached(node, level, lambda batch: sign * fn(batch), constants)
+
+    if isinstance(node, (ast.BinOp, ast.Compare)):
+        if isinstance(node, ast.BinOp):
+            op, left, right = BINARY_OPS.get(type(node.op)), node.left, node.right
+        else:
+            if len(node.ops) != 1:
+                raise ValueError(f"Chained comparisons are not supported in '{expr}'")
+            op, left, right = COMPARE_OPS.get(type(node.ops[0])), node.left, node.comparators[0]
+        if op is None:
+            raise ValueError(f"Unsupported operator in '{expr}'")
+        left_level, left_fn = _compile(left, levels, expr, constants)
+        right_level, right_fn = _compile(right, levels, expr, constants)
+        level = max(left_level, right_level)
+        if level == ROW:
+            left_fn, right_fn = _broadcast(left_level, left_fn), _broadcast(right_level, right_fn)
+        return level, _cached(node, level, lambda batch: op(left_fn(batch), right_fn(batch)), constants)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1 and not node.keywords:
+        name = node.func.id
+        level, fn = _compile(node.args[0], levels, expr, constants)
+        if name in AGGREGATES:
+            if level != ROW:
+                raise ValueError(f"{name}() needs a per-parameter argument in '{expr}'")
+            return SAMPLE, _cached(node, SAMPLE, lambda batch: _aggregate(name, batch, fn(batch)), constants)
+        if name in FUNCTIONS:
+            func = FUNCTIONS[name]
+            return level, _cached(node, level, lambda batch: func(fn(batch)), constants)
+        raise ValueError(f"Unknown function '{name}' in '{expr}'")
+
+    raise ValueError(f"Unsupported syntax in '{expr}'")
+
+
+class FormulaRegistry:
+    """
+    Indices compiled from a spec (see the module docstring). evaluate() computes
+    every index for a whole batch at once, categorize() applies the declared
+    thresholds and conclusion rules.
+    """
+    def __init__(self, spec):
+        self.spec = json.loads(json.dumps(spec))  # private copy, and checks it is plain data
+        self.spec.setdefault("terms", {})
+        self.spec.setdefault("indices", {})
+        self.spec.setdefault("conclusion", [])
+        self._compile()
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def indices(self):
+        return tuple(self.spec["indices"])
+
+    def add_index(self, name, expr, thresholds=(), labels=(), invalid=None):
+        """Declares a new index (or replaces one) and recompiles the registry."""
+        if name in COLUMNS or name in self.spec["terms"]:
+            raise ValueError(f"'{name}' is already a column or term")
+        definition = {"expr": expr, "thresholds": list(thresholds), "labels": list(labels)}
+        if invalid is not None:
+            definition["invalid"] = invalid
+        previous = self.spec["indices"].get(name)
+        self.spec["indices"][name] = definition
+        try:
+            self._compile()
+        except ValueError:
+            if previous is None:
+                del self.spec["indices"][name]
+            else:
+                self.spec["indices"][name] = previous
+            raise
+
+    def _compile(self):
+        spec = self.spec
+        levels = dict.fromkeys(COLUMNS, ROW)
+        constant_names = set(STANDARD_COLUMNS)
+        self._constants = {}
+        self._where = None
+        if spec.get("where"):
+            level, self._where = compile_expression(spec["where"], levels, constant_names, self._constants)
+            if level != ROW:
+                raise ValueError("'where' must be a per-parameter condition")
+
+        self._terms = []
+        for name, expr in spec["terms"].items():
+            level, fn = compile_expression(expr, levels, constant_names, self._constants)
+            self._terms.append((name, _broadcast(level, fn)))
+            levels[name] = ROW if level != SCALAR else SCALAR
+            if level == ROW and _is_parameter_constant(ast.parse(expr, mode="eval"), constant_names):
+                constant_names.add(name)
+        self._constant_terms = constant_names - set(STANDARD_COLUMNS)
+
+        self._valid = None
+        if spec.get("valid"):
+            level, self._valid = compile_expression(spec["valid"], levels, constant_names, self._constants)
+            if level != SAMPLE:
+                raise ValueError("'valid' must be a per-sample condition")
+
+        self._indices = []
+        for name, definition in spec["indices"].items():
+            level, fn = compile_expression(definition["expr"], levels, constant_names, self._constants)
+            if level == ROW:
+                raise ValueError(f"Index '{name}' must aggregate its parameters, e.g. sum(...)")
+            thresholds, labels = definition.get("thresholds", []), definition.get("labels", [])
+            if labels and len(labels) != len(thresholds) + 1:
+                raise ValueError(f"Index '{name}' needs one more label than thresholds")
+            self._indices.append((name, fn, definition.get("invalid", float("nan"))))
+            levels[name] = SAMPLE
+
+        for label, conditions in spec["conclusion"]:
+            unknown = set(conditions) - set(spec["indices"])
+            if unknown:
+                raise ValueError(f"Conclusion '{label}' refers to unknown indices {sorted(unknown)}")
+
+    def parameter_constants(self, Si, Ii, MACi):
+        """
+        Precomputes, for parameters with the given standards arrays, every
+        per-parameter subexpression that only depends on Si, Ii and MACi
+        (such as 1 / Si or the Si > 0 filter). Pass the result to evaluate()
+        with each row's parameter code to broadcast it instead of recomputing.
+        """
+        n = len(Si)
+        columns = {"Ci": np.full(n, np.nan), "Si": Si, "Ii": Ii, "MACi": MACi}
+        batch = _Batch(np.arange(n), n, {name: np.asarray(v, dtype=float) for name, v in columns.items()})
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name, fn in self._terms:
+                if name in self._constant_terms:
+                    batch.values[name] = fn(batch)
+            return {key: np.asarray(fn(batch)) for key, fn in self._constants.items()}
+
+    def evaluate(self, codes, n_samples, columns, parameters=None, constants=None):
+        """
+        Computes every index for a batch. codes gives each row's sample number
+        (0 .. n_samples - 1) and columns the Ci, Si, Ii and MACi arrays (floats,
+        NaN for missing). With parameters (each row's parameter code) and their
+        parameter_constants(), those subexpressions are looked up, not computed.
+        Returns {index: array of n_samples values}.
+        """
+        codes = np.asarray(codes, dtype=np.intp)
+        columns = {name: np.asarray(columns[name], dtype=float) for name in COLUMNS}
+        if parameters is not None:
+            parameters = np.asarray(parameters, dtype=np.intp)
+        if self._where is not None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                keep = self._where(_Batch(codes, n_samples, columns, parameters, constants))
+            codes = codes[keep]
+            columns = {name: values[keep] for name, values in columns.items()}
+            if parameters is not None:
+                parameters = parameters[keep]
+
+        batch = _Batch(codes, n_samples, columns, parameters, constants)
+        results = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name, fn in self._terms:
+                batch.values[name] = fn(batch)
+            valid = self._valid(batch) if self._valid is not None else None
+            for name, fn, invalid in self._indices:
+                values = np.broadcast_to(np.asarray(fn(batch), dtype=float), n_samples).copy()
+                if valid is not None:
+                    values[~valid] = invalid
+                batch.values[name] = results[name] = values
+        return results
+
+    def evaluate_sample(self, columns):
+        """
+        evaluate() for a single sample: columns maps Ci, Si, Ii and MACi to that
+        sample's per-parameter values (None or NaN for missing). Returns {index: float}.
+        """
+        columns = {name: np.asarray(columns[name], dtype=float) for name in COLUMNS}
+        values = self.evaluate(np.zeros(len(columns["Ci"]), dtype=np.intp), 1, columns)
+        return {name: float(value[0]) for name, value in values.items()}
+
+    def categorize_sample(self, values):
+        """categorize() for evaluate_sample() output: {category: label}."""
+        categories = self.categorize({name: np.array([value]) for name, value in values.items()})
+        return {name: str(labels[0]) for name, labels in categories.items()}
+
+    def categorize(self, values):
+        """
+        Category labels for evaluate() output: {"<index>_Category": array} for
+        every index with thresholds, plus "OverallConclusion" when rules exist.
+        NaN compares False everywhere, so it falls into the last category.
+        """
+        categories = {}
+        for name, definition in self.spec["indices"].items():
+            labels = definition.get("labels")
+            if not labels:
+                continue
+            index = np.asarray(values[name], dtype=float)
+            categories[f"{name}_Category"] = np.select(
+                [index < t for t in definition["thresholds"]], labels[:-1], labels[-1])
+
+        rules = self.spec["conclusion"]
+        if rules:
+            n = len(next(iter(categories.values()))) if categories else 0
+            conditions, labels, default = [], [], ""
+            for label, matches in rules:
+                if not matches:
+                    default = label
+                    break
+                condition = np.zeros(n, dtype=bool)
+                for name, accepted in matches.items():
+                    condition |= np.isin(categories[f"{name}_Category"], accepted)
+                conditions.append(condition)
+                labels.append(label)
+            categories["OverallConclusion"] = np.select(conditions, labels, default) if conditions else \
+                np.full(n, default)
+        return categories
+
+
+FORMULA1 = FormulaRegistry(FORMULA1_SPEC)
+FORMULAE = FormulaRegistry(FORMULAE_SPEC)
@@ -1,94 +1,49 @@
-def calculate_indices(df):
-    
-    # === Step 1: Calculate sub-indices ===
- 
-    # Qi = Sub-index of ith metal
-    # Measures how much the current concentration Ci deviates from the ideal value Ii
-    # Si is the standard permissible value for that metal
-    # Formula: Qi = ((Ci - Ii) / (Si - Ii)) * 100
-    
-    df["Qi"] = ((df["Ci"] - df["Ii"]) / (df["Si"] - df["Ii"])) * 100  
-
-    # Wi = Weight of the nth metal
-    # Higher weight for metals with lower permissible limits (more toxic)
-    # Formula: Wi = (1/Si) / sum(1/Si for all metals)
-    
-    df["Wi"] = (1 / df["Si"]) / (1 / df["Si"]).sum()
-
-    # Cfi = Contamination factor for ith metal
-    # Ratio of measured concentration to standard
-    
-    df["Cfi"] = df["Ci"] / df["Si"]
-
-    # === Step 2: Calculate Indices ===
-
-    # HPI (Heavy Metal Pollution Index)
-    # Weighted average of sub-indices Qi
-    # Interpretation:
-    # HPI < 50: Low/acceptable pollution
-    # 50 <= HPI <100 : Moderate pollution
-    # 100 <= HPI <200: High pollution
-    # HPI >= 200: Very high pollution
-    
-    HPI = (df["Qi"] * df["Wi"]).sum() / df["Wi"].sum()
-
-    # HEI (Heavy Metal Evaluation Index)
-    # Sum of ratios of concentration to maximum allowable concentration (MACi)
-    # Interpretation:
-    # HEI < 10: Low risk
-    # 10 <= HEI <20 : Medium risk
-    # 20 <= HEI <50 : High risk
-    # HEI >= 50: Very high risk
-    
-    HEI = (df["Ci"] / df["MACi"]).sum()
+import numpy as np
+from formula_registry import FORMULAE
 
-    # Cd (Contamination Degree)
-    # Sum of contamination factors minus 1
-    # Shows overall contamination above permissible limits
-    # Interpretation:
-    # Cd < 1: Low contamination
-    # 1 <= Cd < 3 : Moderate contamination
-    # 3 <= Cd < 6 : High contamination
-    # Cd >= 6: Very high contamination
-    
-    Cd = (df["Cfi"] - 1).sum()
+def calculate_indices(df):
+    """
+    HPI, HEI and Cd of one sample (rows with Ci, Si, Ii and MACi), evaluated by
+    formula_registry.FORMULAE; see FORMULAE_SPEC for the formulas.
+    """
+    values = FORMULAE.evaluate_sample(df)
+    return values["HPI"], values["HEI"], values["Cd"]
 
-    return HPI, HEI, Cd
-    
 def categorize_indices(HPI, HEI, Cd):
-    # HPI
-    if HPI < 100:
-        hpi_cat = "safe"
-    elif HPI < 200:
-        hpi_cat = "caution"
-    else:
-        hpi_cat = "unsafe"
-
-    # HEI
-    if HEI < 10:
-        hei_cat = "low pollution"
-    elif HEI < 20:
-        hei_cat = "medium"
-    else:
-        hei_cat = "high"
-
-    # Cd
-    if Cd < 1:
-        cd_cat = "low contamination"
-    elif Cd < 3:
-        cd_cat = "medium"
-    else:
-        cd_cat = "high"
-
-    # Precise conclusion
-    if hpi_cat == "unsafe" or cd_cat == "high":
-        conclusion = "Unsafe"
-    elif hpi_cat == "caution" or cd_cat == "medium":
-        conclusion = "Moderate / Caution"
-    else:
-        conclusion = "Safe"
-
-    return hpi_cat, hei_cat, cd_cat, conclusion
+    """
+    Category of each index and the overall conclusion, from the thresholds and
+    rules declared in FORMULAE_SPEC.
+    """
+    categories = FORMULAE.categorize_sample({"HPI": HPI, "HEI": HEI, "Cd": Cd})
+    return categories["HPI_Category"], categories["HEI_Category"], categories["Cd_Category"], categories["OverallConclusion"]
+
+def calculate_indices_columns(sample_ids, Ci, Si, Ii, MACi, parameters=None, constants=None):
+    """
+    Vectorised calculate_indices over parallel per-parameter arrays holding many
+    samples. Returns (samples, HPI, HEI, Cd) arrays, samples in order of first
+    appearance, matching what calculate_indices gives for each sample on its own.
+    parameters and constants (standards.Standards codes and constants) let the
+    per-parameter terms be looked up instead of computed.
+    """
+    sample_ids = np.asarray(sample_ids)
+
+    # Sample codes in order of first appearance
+    uniques, first, codes = np.unique(sample_ids, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    codes = rank[codes.ravel()]
+    samples = uniques[order]
+
+    values = FORMULAE.evaluate(codes, len(samples), dict(Ci=Ci, Si=Si, Ii=Ii, MACi=MACi), parameters, constants)
+    return samples, values["HPI"], values["HEI"], values["Cd"]
+
+def categorize_indices_columns(HPI, HEI, Cd):
+    """
+    Vectorised categorize_indices: returns (hpi_cat, hei_cat, cd_cat, conclusion) arrays.
+    """
+    categories = FORMULAE.categorize({"HPI": HPI, "HEI": HEI, "Cd": Cd})
+    return categories["HPI_Category"], categories["HEI_Category"], categories["Cd_Category"], categories["OverallConclusion"]
 
 
 
@@ -0,0 +1,185 @@
+"""
+Incremental HPI / HEI / Cd maintenance for readings that arrive one parameter
+at a time (formula1 definitions). Every index is kept as running per-sample
+sums, so an add, replace or remove event costs O(1) whatever the sample size.
+"""
+import math
+import pandas as pd
+from formula1 import categorize_indices, results_frame
+
+COLUMNS = ("Ci", "Si", "Ii", "MACi")
+
+
+def _to_float(value):
+    # Same coercion as pd.to_numeric(errors="coerce")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class RunningSum:
+    """
+    Sum that supports removing terms and skips NaN like Series.sum(). Finite
+    terms use Neumaier compensation; infinities are counted, so removing one
+    restores the finite total.
+    """
+    __slots__ = ("total", "compensation", "pos_inf", "neg_inf")
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+        self.pos_inf = 0
+        self.neg_inf = 0
+
+    def add(self, x, sign=1):
+        if math.isnan(x):
+            return
+        if x == math.inf:
+            self.pos_inf += sign
+        elif x == -math.inf:
+            self.neg_inf += sign
+        else:
+            x = x * sign
+            t = self.total + x
+            if abs(self.total) >= abs(x):
+                self.compensation += (self.total - t) + x
+            else:
+                self.compensation += (x - t) + self.total
+            self.total = t
+
+    def remove(self, x):
+        self.add(x, -1)
+
+    def value(self):
+        if self.pos_inf and self.neg_inf:
+            return math.nan
+        if self.pos_inf:
+            return math.inf
+        if self.neg_inf:
+            return -math.inf
+        return self.total + self.compensation
+
+
+class _SampleState:
+    __slots__ = ("readings", "valid", "inv_si", "q_inv_si", "hei", "cd")
+
+    def __init__(self):
+        self.readings = {}      # ParameterName -> (Ci, Si, Ii, MACi)
+        self.valid = 0          # readings with Si > 0, the rows formula1 keeps
+        self.inv_si = RunningSum()
+        self.q_inv_si = RunningSum()
+        self.hei = RunningSum()
+        self.cd = RunningSum()
+
+    def apply(self, reading, sign):
+        ci, si, ii, maci = reading
+        if not si > 0:
+            return
+        self.valid += sign
+        for running, term in zip((self.inv_si, self.q_inv_si, self.hei, self.cd), _terms(ci, si, ii, maci)):
+            running.add(term, sign)
+
+
+def _div(a, b):
+    # IEEE division as numpy does it: x / 0 is +-inf and 0 / 0 is NaN
+    try:
+        return a / b
+    except OverflowError:
+        return math.copysign(math.inf, a) * math.copysign(1, b)
+    except ZeroDivisionError:
+        return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a) * math.copysign(1, b)
+
+def _terms(ci, si, ii, maci):
+    # Per-reading contributions: 1/Si, Qi/Si (HPI numerator), Ci/Si (HEI), Ci/MACi (Cd)
+    inv_si = _div(1.0, si)
+    qi = _div(ci - ii, si - ii) * 100
+    return inv_si, qi * inv_si, _div(ci, si), _div(ci, maci)
+
+
+class IndexAggregator:
+    """
+    HPI, HEI, Cd and their categories per SampleID, kept up to date from
+    add / replace / remove events for single parameters. result() and results()
+    agree with formula1.calculate_indices / results_frame over the current
+    readings (up to rounding in the last bits of the sums).
+    """
+    def __init__(self):
+        self._samples = {}
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __contains__(self, sample_id):
+        return sample_id in self._samples
+
+    def add(self, sample_id, parameter, Ci, Si, Ii, MACi):
+        """Adds a parameter reading; KeyError if the sample already has one for it."""
+        state = self._samples.setdefault(sample_id, _SampleState())
+        if parameter in state.readings:
+            raise KeyError(f"Sample {sample_id} already has a reading for '{parameter}'")
+        reading = tuple(_to_float(v) for v in (Ci, Si, Ii, MACi))
+        state.readings[parameter] = reading
+        state.apply(reading, 1)
+
+    def replace(self, sample_id, parameter, Ci, Si, Ii, MACi):
+        """Replaces an existing reading; KeyError if there is none."""
+        self.remove(sample_id, parameter)
+        self.add(sample_id, parameter, Ci, Si, Ii, MACi)
+
+    def remove(self, sample_id, parameter):
+        """Removes a reading; the sample disappears with its last reading."""
+        state = self._samples.get(sample_id)
+        if state is None or parameter not in state.readings:
+            raise KeyError(f"Sample {sample_id} has no reading for '{parameter}'")
+        state.apply(state.readings.pop(parameter), -1)
+        if not state.readings:
+            del self._samples[sample_id]
+
+    def apply(self, event):
+        """
+        Applies an event dict: {"event": "add" | "replace" | "remove", "SampleID",
+        "ParameterName"} plus Ci, Si, Ii and MACi for add and replace.
+        """
+        kind = event.get("event")
+        if kind == "remove":
+            self.remove(event["SampleID"], event["ParameterName"])
+        elif kind in ("add", "replace"):
+            getattr(self, kind)(event["SampleID"], event["ParameterName"], *(event[col] for col in COLUMNS))
+        else:
+            raise ValueError(f"Unknown event type '{kind}'")
+
+    def indices(self, sample_id):
+        """(HPI, HEI, Cd) of one sample, as formula1.calculate_indices returns them."""
+        state = self._samples[sample_id]
+        inv_si = state.inv_si.value()
+        if state.valid == 0 or inv_si == 0:
+            return float("nan"), 0.0, 0.0
+        # sum(Qi * Wi) / sum(Wi) with Wi = (1/Si) / sum(1/Si); the normalisation cancels
+        return _div(state.q_inv_si.value(), inv_si), state.hei.value(), state.cd.value()
+
+    def result(self, sample_id):
+        """(HPI, HEI, Cd, hpi_cat, hei_cat, cd_cat, conclusion) of one sample."""
+        HPI, HEI, Cd = self.indices(sample_id)
+        return (HPI, HEI, Cd) + categorize_indices(HPI, HEI, Cd)
+
+    def results(self, sample_col="SampleID"):
+        """All samples in the formula1.results_frame layout, sorted by sample."""
+        samples = sorted(self._samples)
+        rows = [self.indices(sample_id) for sample_id in samples]
+        indices = pd.DataFrame(rows, columns=["HPI", "HEI", "Cd"], index=pd.Index(samples, name=sample_col))
+        return results_frame(indices.astype(float))
+
+    def snapshot(self):
+        """The current readings as a long-format DataFrame (SampleID, ParameterName, Ci, Si, Ii, MACi)."""
+        rows = [(sample_id, parameter) + reading
+                for sample_id, state in self._samples.items() for parameter, reading in state.readings.items()]
+        return pd.DataFrame(rows, columns=["SampleID", "ParameterName", *COLUMNS])
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds an aggregator from a long-format frame such as snapshot() output."""
+        aggregator = cls()
+        for row in df[["SampleID", "ParameterName", *COLUMNS]].itertuples(index=False):
+            aggregator.add(*row)
+        return aggregator
@@ -1,72 +1,316 @@
 import json
 import re
-from typing import List, Dict, Any
+import sys
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+import numpy as np
+from typing import List, Dict, Any, Callable, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+class Reaction(NamedTuple):
+    order: int              # position in registry scan order
+    equation: str
+    type: str               # "heavy_metal" or "environment"
+    reactants: Tuple[str, ...]
+    product: str
+    reactant_ids: Tuple[int, ...]
+    reactant_mask: int      # bitmask of reactant_ids
+    product_id: int
+
+
+class CompiledRegistry(NamedTuple):
+    reactions: Tuple[Reaction, ...]
+    species: Tuple[str, ...]                    # species ID -> name
+    species_id: Mapping[str, int]               # name -> dense species ID
+    by_reactant: Tuple[Tuple[int, ...], ...]    # species ID -> orders of reactions it takes part in
+    incidence: np.ndarray                       # (species, reactions) uint8: species is a reactant, read-only
+    lhs_size: np.ndarray                        # distinct reactants per reaction
+    product_ids: np.ndarray                     # product species ID per reaction
+    malformed: Tuple[str, ...]
+
+    def __reduce__(self):
+        # mappingproxy cannot be pickled; rebuild it (and the read-only flags) on load
+        return (_restore_compiled, (tuple(self._replace(species_id=dict(self.species_id))),))
+
+
+def _restore_compiled(fields) -> CompiledRegistry:
+    compiled = CompiledRegistry(*fields)
+    for array in (compiled.incidence, compiled.lhs_size, compiled.product_ids):
+        array.setflags(write=False)
+    return compiled._replace(species_id=MappingProxyType(compiled.species_id))
+
+
+REACTION_SECTIONS = (("reactions_with_heavy_metals", "heavy_metal"), ("reactions_with_environment", "environment"))
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
 
 class HeavyMetalReactionEngine:
-    def __init__(self, registry_path: str):
-        with open(registry_path, 'r') as f:
-            self.registry = json.load(f)
+    # Environment fields that change the simulated chain; they are part of the
+    # cache key. The current registry has no environment-dependent reactions.
+    environment_fields: Tuple[str, ...] = ()
 
-    def simulate_reactions(self, input_metals: List[str], environment: Dict[str, Any]) -> List[Dict[str, Any]]:
-        compounds = input_metals.copy()
-        reaction_chain = []
-        max_depth = 10  # To avoid infinite loops
+    def __init__(self, registry_path: str, cache_size: int = 1024):
+        self.registry_path = registry_path
+        self._init_cache(cache_size)
+        self._load()
 
-        for _ in range(max_depth):
-            reaction_applied = False
+    @classmethod
+    def from_compiled(cls, compiled: CompiledRegistry, cache_size: int = 0) -> "HeavyMetalReactionEngine":
+        """Engine over an already compiled registry, without reading or watching a file."""
+        engine = cls.__new__(cls)
+        engine.registry_path = None
+        engine.registry = None
+        engine.compiled = compiled
+        engine._registry_stamp = None
+        engine._init_cache(cache_size)
+        return engine
 
-            for element_block in self.registry:
-                # Heavy metal reactions
-                for reaction_eq in element_block.get("reactions_with_heavy_metals", []):
+    def _init_cache(self, cache_size: int):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Tuple[Dict[str, Any], ...]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def _load(self):
+        stat = os.stat(self.registry_path)
+        with open(self.registry_path, 'r') as f:
+            self.registry = json.load(f)
+        self.compiled = self._compile(self.registry)
+        self._registry_stamp = (stat.st_mtime_ns, stat.st_size)
+        self._cache.clear()
+
+    def _check_registry(self):
+        # Reload (and drop cached chains) when reactions.json changes on disk
+        if self.registry_path is None:
+            return
+        stat = os.stat(self.registry_path)
+        if (stat.st_mtime_ns, stat.st_size) != self._registry_stamp:
+            with self._cache_lock:
+                self._load()
+
+    def _compile(self, registry: List[Dict[str, Any]]) -> CompiledRegistry:
+        parsed = []
+        malformed = []
+        for element_block in registry:
+            for section, reaction_type in REACTION_SECTIONS:
+                for reaction_eq in element_block.get(section, []):
                     try:
                         reactants = self._extract_reactants(reaction_eq)
                         product = self._extract_product(reaction_eq)
                     except ValueError:
-                        print(f"[Warning] Skipping malformed equation: {reaction_eq}")
+                        malformed.append(reaction_eq)
                         continue
+                    parsed.append((reaction_eq, reaction_type, reactants, product))
 
-                    if all(r in compounds for r in reactants) and product not in compounds:
-                        compounds.append(product)
-                        reaction_chain.append({
-                            "equation": reaction_eq,
-                            "type": "heavy_metal",
-                            "product": product
-                        })
-                        reaction_applied = True
-                        break  # Apply only one reaction per iteration
-
-                if reaction_applied:
-                    break  # Restart loop after applying one reaction
-
-                # Environment reactions
-                for reaction_eq in element_block.get("reactions_with_environment", []):
-                    try:
-                        reactants = self._extract_reactants(reaction_eq)
-                        product = self._extract_product(reaction_eq)
-                    except ValueError:
-                        print(f"[Warning] Skipping malformed equation: {reaction_eq}")
-                        continue  # Skip this reaction
+        for reaction_eq in malformed:
+            print(f"[Warning] Skipping malformed equation: {reaction_eq}")
+
+        # Intern species to dense IDs in order of first appearance
+        species_id: Dict[str, int] = {}
+        for _, _, reactants, product in parsed:
+            for s in (*reactants, product):
+                species_id.setdefault(sys.intern(s), len(species_id))
+
+        reactions = []
+        by_reactant: List[List[int]] = [[] for _ in species_id]
+        incidence = np.zeros((len(species_id), len(parsed)), dtype=np.uint8)
+        for order, (reaction_eq, reaction_type, reactants, product) in enumerate(parsed):
+            ids = sorted({species_id[r] for r in reactants})
+            for i in ids:
+                by_reactant[i].append(order)
+            incidence[ids, order] = 1
+            reactions.append(Reaction(
+                order=order,
+                equation=reaction_eq,
+                type=reaction_type,
+                reactants=tuple(sys.intern(r) for r in reactants),
+                product=sys.intern(product),
+                reactant_ids=tuple(ids),
+                reactant_mask=sum(1 << i for i in ids),
+                product_id=species_id[product]
+            ))
+
+        product_ids = np.array([r.product_id for r in reactions], dtype=np.intp)
+        lhs_size = incidence.sum(axis=0, dtype=np.intp)
+        for array in (incidence, lhs_size, product_ids):
+            array.setflags(write=False)
+
+        return CompiledRegistry(
+            reactions=tuple(reactions),
+            species=tuple(species_id),
+            species_id=MappingProxyType(species_id),
+            by_reactant=tuple(tuple(orders) for orders in by_reactant),
+            incidence=incidence,
+            lhs_size=lhs_size,
+            product_ids=product_ids,
+            malformed=tuple(malformed)
+        )
 
-                    if all(r in compounds for r in reactants) and product not in compounds:
-                        compounds.append(product)
-                        reaction_chain.append({
-                            "equation": reaction_eq,
-                            "type": "environment",
-                            "product": product
-                        })
-                        reaction_applied = True
-                        break
+    def species_mask(self, species: List[str]) -> np.ndarray:
+        """Boolean presence array over species IDs; names unknown to the registry are ignored."""
+        present = np.zeros(len(self.compiled.species), dtype=bool)
+        present[[self.compiled.species_id[s] for s in species if s in self.compiled.species_id]] = True
+        return present
 
-                if reaction_applied:
-                    break
+    def enabled_reactions(self, present: np.ndarray) -> np.ndarray:
+        """
+        Orders of every reaction that can fire given a species presence array:
+        all reactants present and product not yet present. One vectorized pass.
+        """
+        compiled = self.compiled
+        # Count present reactants per reaction by summing the rows of present species
+        satisfied = compiled.incidence[present].sum(axis=0, dtype=np.intp) == compiled.lhs_size
+        return np.flatnonzero(satisfied & ~present[compiled.product_ids])
 
-            if not reaction_applied:
-                break  
+    def simulate_reactions(self, input_metals: List[str], environment: Dict[str, Any],
+                           max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Forward-chains the registry from input_metals until no reaction can add
+        a new product. Enabled reactions fire in registry order, so the chain is
+        reproducible. max_depth limits how many reactions deep a product may be
+        derived from the inputs (None means run to the fixpoint).
+        Results are memoized per species set, environment_fields and max_depth.
+        """
+        self._check_registry()
+        species, env = self._composition_key(input_metals, environment)
+        key = (self._registry_stamp, species, env, max_depth)
+
+        cached = self._cache_get(key)
+        if cached is not None:
+            return [dict(step) for step in cached]
+
+        reaction_chain = self._simulate(species, max_depth)
+        self._cache_put(key, reaction_chain)
+        return reaction_chain
+
+    def simulate_bulk(self, samples: Iterable[Tuple[List[str], Dict[str, Any]]], max_depth: Optional[int] = None,
+                      processes: Optional[int] = None, chunksize: Optional[int] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        simulate_reactions for many (input_metals, environment) samples.
+        Duplicate compositions are simulated once; cache misses are spread over a
+        process pool (processes=None uses every core, 1 runs in-process) whose
+        workers receive the compiled registry once instead of re-reading the file.
+        progress(done, total) is called as unique compositions finish.
+        Returns one reaction chain per sample, in input order.
+        """
+        self._check_registry()
+        keys = [self._composition_key(input_metals, environment) for input_metals, environment in samples]
+        unique = list(dict.fromkeys(keys))
+
+        chains = {}
+        pending = []
+        for species, env in unique:
+            cached = self._cache_get((self._registry_stamp, species, env, max_depth))
+            if cached is not None:
+                chains[species, env] = cached
+            else:
+                pending.append((species, env))
+
+        done, total = len(chains), len(unique)
+        if progress is not None:
+            progress(done, total)
+
+        executor = None
+        if processes == 1 or len(pending) < 2:
+            computed = (self._simulate(species, max_depth) for species, _ in pending)
+        else:
+            workers = processes or os.cpu_count() or 1
+            if chunksize is None:
+                chunksize = max(1, len(pending) // (workers * 4))
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.compiled,))
+            computed = executor.map(_simulate_worker, [(species, max_depth) for species, _ in pending],
+                                    chunksize=chunksize)
+
+        try:
+            for (species, env), reaction_chain in zip(pending, computed):
+                self._cache_put((self._registry_stamp, species, env, max_depth), reaction_chain)
+                chains[species, env] = reaction_chain
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        return [[dict(step) for step in chains[key]] for key in keys]
+
+    def _composition_key(self, input_metals: List[str], environment: Dict[str, Any]) -> tuple:
+        return (
+            tuple(sorted(set(input_metals))),
+            tuple((field, environment.get(field)) for field in self.environment_fields)
+        )
+
+    def _cache_get(self, key: tuple) -> Optional[Tuple[Dict[str, Any], ...]]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                self._misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return cached
+
+    def _cache_put(self, key: tuple, reaction_chain: List[Dict[str, Any]]):
+        with self._cache_lock:
+            self._cache[key] = tuple(dict(step) for step in reaction_chain)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self._evictions += 1
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._evictions, len(self._cache), self.cache_size)
+
+    def cache_clear(self):
+        with self._cache_lock:
+            self._cache.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def _simulate(self, input_metals, max_depth: Optional[int]) -> List[Dict[str, Any]]:
+        reactions = self.compiled.reactions
+        present_array = self.species_mask(input_metals)
+        present = sum(1 << int(i) for i in np.flatnonzero(present_array))
+        depth = [0] * len(self.compiled.species)
+        reaction_chain = []
+
+        # Agenda of reactions whose reactants are all present, keyed by scan order.
+        # The initial wave comes from one vectorized check; after that a reaction is
+        # pushed once, when the last of its reactants is added.
+        agenda = self.enabled_reactions(present_array).tolist()
+
+        while agenda:
+            reaction = reactions[heapq.heappop(agenda)]
+            if present >> reaction.product_id & 1:
+                continue
+
+            product_depth = 1 + max((depth[i] for i in reaction.reactant_ids), default=0)
+            if max_depth is not None and product_depth > max_depth:
+                continue
+
+            present |= 1 << reaction.product_id
+            depth[reaction.product_id] = product_depth
+            reaction_chain.append({
+                "equation": reaction.equation,
+                "type": reaction.type,
+                "product": reaction.product
+            })
+            for order in self.compiled.by_reactant[reaction.product_id]:
+                mask = reactions[order].reactant_mask
+                if present & mask == mask:
+                    heapq.heappush(agenda, order)
 
         return reaction_chain
 
     def _normalize_arrows(self, equation: str) -> str:
-        print(f"Normalizing equation: {equation.encode('unicode_escape')}")
         equation = equation.replace('→', '->').replace('\u2192', '->').replace('\u2794', '->').replace('\u2013', '->')
         return equation
 
@@ -85,6 +329,17 @@ class HeavyMetalReactionEngine:
             raise ValueError(f"Malformed equation (no product found): '{equation}'")
         return parts[1].strip()
 
+# Process pool workers share one compiled registry, sent once per worker
+_worker_engine: Optional[HeavyMetalReactionEngine] = None
+
+def _init_worker(compiled: CompiledRegistry):
+    global _worker_engine
+    _worker_engine = HeavyMetalReactionEngine.from_compiled(compiled)
+
+def _simulate_worker(args) -> List[Dict[str, Any]]:
+    species, max_depth = args
+    return _worker_engine._simulate(species, max_depth)
+
 # Example usage !!!!
 if __name__ == "__main__":
     engine = HeavyMetalReactionEngine('reactions.json')
@@ -1,6 +1,6 @@
 import pandas as pd
 import json
-from formulae import calculate_indices, categorize_indices
+from formulae import calculate_indices_columns, categorize_indices_columns
 
 # === Load dataset from CSV ===
 df = pd.read_csv("waterqualitydataset.csv")
@@ -11,16 +11,13 @@ for col in ["Ci", "Si", "Ii", "MACi"]:
 
 results = []  # <-- define list before loop
 
-# === Process each sample and display results ===
-for sample_id, row in df.groupby("SampleID"):
-    sample_df = row[["ParameterName", "Ci", "Si", "Ii", "MACi"]]
-
-    # Calculate indices
-    HPI, HEI, Cd = calculate_indices(sample_df)
-
-    # Categorize indices
-    hpi_cat, hei_cat, cd_cat, conclusion = categorize_indices(HPI, HEI, Cd)
+# === Process every sample in one pass and display results ===
+df = df.sort_values("SampleID", kind="stable")
+samples, HPIs, HEIs, Cds = calculate_indices_columns(
+    df["SampleID"].to_numpy(), *(df[col].to_numpy() for col in ["Ci", "Si", "Ii", "MACi"]))
+categories = categorize_indices_columns(HPIs, HEIs, Cds)
 
+for sample_id, HPI, HEI, Cd, hpi_cat, hei_cat, cd_cat, conclusion in zip(samples, HPIs, HEIs, Cds, *categories):
     # Store result
     result = {
         "SampleID": int(sample_id),
@@ -0,0 +1,203 @@
+"""
+Two-tier result cache: a bounded in-process LRU in front of an optional SQLite
+file that survives restarts. Entries expire ttl seconds after they were stored.
+Values must be JSON-serializable; they are kept as JSON text, so every get()
+returns a fresh copy the caller may modify.
+"""
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    hits: int           # served from memory
+    disk_hits: int      # served from the SQLite tier (and promoted to memory)
+    misses: int
+    evictions: int      # dropped from memory to respect maxsize
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+def content_key(payload):
+    """SHA-256 of the canonical JSON encoding of payload (dict keys sorted)."""
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    maxsize bounds the memory tier; ttl (seconds, None for no expiry) applies
+    to both tiers; path enables the SQLite tier. clock is time.time by default.
+
+    Disk writes are queued to a background thread, so put() never waits for a
+    commit. Disk reads run outside the lock on a connection per thread, so
+    callers on an event loop should run get() in a thread pool unless
+    in_memory(key) says it will not touch the disk. Every prune_every writes that thread deletes expired rows and the
+    oldest-written rows beyond disk_maxsize, so the file holds at most
+    disk_maxsize + prune_every rows.
+    """
+    def __init__(self, maxsize=4096, ttl=None, path=None, clock=time.time, disk_maxsize=100_000, prune_every=256):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.prune_every = prune_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()    # key -> (expires, json text)
+        self._hits = self._disk_hits = self._misses = self._evictions = 0
+        self._local = threading.local()     # one read connection per thread
+        self._connections = []
+        self._closed = path is None
+        self._queue = None
+        if path:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                         "expires REAL)")
+            self._prune(conn)
+            self._queue = queue.Queue()
+            threading.Thread(target=self._write_loop, name="result-cache", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)   # closed by close(), whichever thread made it
+        return conn
+
+    def in_memory(self, key):
+        """True if key has an unexpired entry in the memory tier, so get() will not read the disk."""
+        entry = self._memory.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > self._clock())
+
+    def get(self, key):
+        """The cached value for key, or None."""
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                del self._memory[key]
+            if self._closed:
+                self._misses += 1
+                return None
+
+        # Expired rows are left to the periodic prune, so lookups stay read-only
+        row = self._connect().execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is not None and (row[1] is None or row[1] > now):
+                self._store_memory(key, row[1], row[0])
+                self._disk_hits += 1
+                return json.loads(row[0])
+            self._misses += 1
+            return None
+
+    def put(self, key, value):
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        text = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._store_memory(key, expires, text)
+        if self._queue is not None:
+            self._queue.put((key, text, expires))
+
+    def _store_memory(self, key, expires, text):
+        self._memory[key] = (expires, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _write_loop(self):
+        conn = None
+        since_prune = 0
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in items
+            rows = [item for item in items if item is not None]
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.path, timeout=30)
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)", rows)
+                    since_prune += len(rows)
+                    if since_prune >= self.prune_every:
+                        self._prune(conn)
+                        since_prune = 0
+            except sqlite3.Error:
+                pass    # the cache is best-effort; the results are simply computed again
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                if conn is not None:
+                    conn.close()
+                return
+
+    def _prune(self, conn):
+        """Deletes expired rows, then the oldest-written rows beyond disk_maxsize."""
+        conn.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires <= ?", (self._clock(),))
+        excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.disk_maxsize
+        if excess > 0:
+            # INSERT OR REPLACE gives a rewritten key a new rowid, so rowid order is write order
+            conn.execute("DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY rowid LIMIT ?)",
+                         (excess,))
+
+    def flush(self):
+        """Waits until every queued disk write is committed."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def disk_size(self):
+        """Number of rows in the SQLite tier (0 without one), after pending writes."""
+        self.flush()
+        if self._closed:
+            return 0
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def info(self):
+        return CacheInfo(self._hits, self._disk_hits, self._misses, self._evictions, len(self._memory), self.maxsize)
+
+    def clear(self):
+        """Empties both tiers and resets the counters."""
+        self.flush()
+        with self._lock:
+            self._memory.clear()
+            self._hits = self._disk_hits = self._misses = self._evictions = 0
+        if not self._closed:
+            self._connect().execute("DELETE FROM results")
+
+    def close(self):
+        """Commits pending writes and closes the SQLite tier."""
+        if self._queue is not None:
+            self._queue.put(None)
+            self.flush()
+            self._queue = None
+            atexit.unregister(self.flush)
+        with self._lock:
+            self._closed = True
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -1,6 +1,6 @@
 import pandas as pd
 import json
-from formula1 import calculate_indices, categorize_indices
+from formula1 import calculate_indices_batch, categorize_indices_batch
 
 data = {
     "SampleID": [1, 1, 1, 1, 1,
@@ -30,16 +30,11 @@ for col in ["Ci", "Si", "Ii", "MACi"]:
 
 results = []  
 
-# === Process each sample and display results ===
-for sample_id, row in df.groupby("SampleID"):
-    sample_df = row[["ParameterName", "Ci", "Si", "Ii", "MACi"]]
-
-    # Calculate indices
-    HPI, HEI, Cd = calculate_indices(sample_df)
-
-    # Categorize indices
-    hpi_cat, hei_cat, cd_cat, conclusion = categorize_indices(HPI, HEI, Cd)
+# === Process every sample in one pass and display results ===
+indices = calculate_indices_batch(df)
+categories = categorize_indices_batch(indices)
 
+for sample_id, HPI, HEI, Cd, hpi_cat, hei_cat, cd_cat, conclusion in indices.join(categories).itertuples():
     # Store result
     result = {
         "SampleID": int(sample_id),
@@ -0,0 +1,130 @@
+"""
+Versioned parameter standards: Si, Ii, MACi and unit per ParameterName, read
+from standards.json. Samples and files can then carry just ParameterName and Ci
+and refer to a standards version by name. The per-parameter parts of the
+formulas (1 / Si, Si - Ii, ...) are computed once per version and registry and
+broadcast over every row of a batch.
+"""
+import os
+import json
+import threading
+import numpy as np
+
+STANDARDS_PATH = "standards.json"
+STANDARD_COLUMNS = ("Si", "Ii", "MACi")
+
+
+class Standards:
+    """
+    One standards version. Parameter codes index its arrays; code -1 (an
+    unknown parameter) maps to NaN standards.
+    """
+    def __init__(self, version, parameters, description=""):
+        self.version = version
+        self.description = description
+        self.names = tuple(parameters)
+        self.units = tuple(p.get("unit", "") for p in parameters.values())
+        self._code = {name: i for i, name in enumerate(self.names)}
+        # One trailing NaN entry, selected by code -1
+        self._values = {col: np.array([float(p[col]) for p in parameters.values()] + [np.nan])
+                        for col in STANDARD_COLUMNS}
+        for values in self._values.values():
+            values.flags.writeable = False
+        self._constants = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, table, version="custom", description=""):
+        """Standards from a frame indexed by ParameterName with Si, Ii, MACi (and optionally unit) columns."""
+        rows = table.to_dict("index")
+        for row in rows.values():
+            row["unit"] = row["unit"] if isinstance(row.get("unit"), str) else ""
+        return cls(version, rows, description)
+
+    def __contains__(self, name):
+        return name in self._code
+
+    def codes(self, names):
+        """Parameter code per name, -1 for parameters without a standard."""
+        if hasattr(names, "map"):  # pandas Series / Index: look up each distinct name once
+            import pandas as pd
+            positions, uniques = pd.factorize(names)
+            lookup = np.array([self._code.get(name, -1) for name in uniques] + [-1], dtype=np.intp)
+            return lookup[positions]
+        return np.array([self._code.get(name, -1) for name in names], dtype=np.intp)
+
+    def columns(self, codes):
+        """{"Si", "Ii", "MACi"} arrays for rows with the given parameter codes."""
+        return {col: values[codes] for col, values in self._values.items()}
+
+    def constants(self, registry):
+        """registry.parameter_constants() for this version, computed once per registry."""
+        entry = self._constants.get(id(registry))
+        if entry is None or entry[0] is not registry:
+            with self._lock:
+                entry = (registry, registry.parameter_constants(**self._values))
+                self._constants[id(registry)] = entry
+        return entry[1]
+
+    def evaluate(self, registry, codes, n_samples, parameters, Ci):
+        """registry.evaluate() for rows given by sample codes, parameter codes and Ci."""
+        columns = dict(self.columns(parameters), Ci=Ci)
+        return registry.evaluate(codes, n_samples, columns, parameters, self.constants(registry))
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "description": self.description,
+            "parameters": {
+                name: {**{col: float(self._values[col][i]) for col in STANDARD_COLUMNS}, "unit": self.units[i]}
+                for i, name in enumerate(self.names)
+            },
+        }
+
+    def frame(self):
+        """The table as a DataFrame indexed by ParameterName (Si, Ii, MACi, unit)."""
+        import pandas as pd
+        table = pd.DataFrame({col: self._values[col][:-1] for col in STANDARD_COLUMNS},
+                             index=pd.Index(self.names, name="ParameterName"))
+        table["unit"] = self.units
+        return table
+
+
+def load_standards(path=STANDARDS_PATH):
+    """Reads a standards file; returns (default version name, {version: Standards})."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    versions = {version: Standards(version, entry["parameters"], entry.get("description", ""))
+                for version, entry in data["versions"].items()}
+    return data.get("default") or next(iter(versions)), versions
+
+
+_standards_lock = threading.Lock()
+_standards = None       # (default, versions) read from STANDARDS_PATH
+_standards_stamp = None
+
+def get_standards(version=None):
+    """
+    The Standards for version (the file's default when None), loading
+    STANDARDS_PATH on first use and again when it changes on disk.
+    Raises KeyError for an unknown version.
+    """
+    global _standards, _standards_stamp
+    stat = os.stat(STANDARDS_PATH)
+    stamp = (STANDARDS_PATH, stat.st_mtime_ns, stat.st_size)
+    if stamp != _standards_stamp:
+        with _standards_lock:
+            if stamp != _standards_stamp:
+                _standards = load_standards(STANDARDS_PATH)
+                _standards_stamp = stamp
+    default, versions = _standards
+    try:
+        return versions[version or default]
+    except KeyError:
+        raise KeyError(f"Unknown standards version '{version}', choose from {sorted(versions)}")
+
+def list_standards():
+    """(default version, list of version names)."""
+    get_standards()
+    default, versions = _standards
+    return default, list(versions)
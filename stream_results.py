@@ -0,0 +1,24 @@
+import argparse
+from formula1 import iter_indices_csv
+from writers import WRITERS, get_writer
+
+# === Stream a long-format dataset through the index engine ===
+# Peak memory depends on --chunksize, not on the size of the input file.
+parser = argparse.ArgumentParser(description="Compute HPI/HEI/Cd for a long-format water quality CSV in chunks.")
+parser.add_argument("input", nargs="?", default="waterqualitydataset.csv")
+parser.add_argument("output", nargs="?", default="output.ndjson")
+parser.add_argument("--chunksize", type=int, default=100_000, help="rows read per chunk")
+parser.add_argument("--format", choices=list(WRITERS), help="output format (default: from the output extension)")
+parser.add_argument("--check-contiguous", action="store_true",
+                    help="fail if a sample's rows are split up (keeps every SampleID in memory)")
+args = parser.parse_args()
+
+n_samples = 0
+with get_writer(args.output, args.format) as writer:
+    for results in iter_indices_csv(args.input, chunksize=args.chunksize,
+                                    check_contiguous=args.check_contiguous):
+        # Write finished samples straight away
+        writer.write(results)
+        n_samples += len(results)
+
+print(f"{n_samples} samples saved to {args.output}")
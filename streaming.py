@@ -0,0 +1,77 @@
+"""
+JSON helpers shared by the API apps: incremental NDJSON request parsing, streamed
+NDJSON responses and fast JSON responses.
+"""
+import json
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pinned in requirements.txt; without it the standard library serializer is used
+    orjson = None
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def is_ndjson(request):
+    return request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_MEDIA_TYPES
+
+async def read_request_items(request, list_key=None):
+    """
+    Returns the items of a request body: one per line for NDJSON bodies (parsed
+    line by line as the upload arrives, blank lines skipped), otherwise the
+    elements of a JSON array (or of body[list_key] when the body is an object).
+    The body is read before the response starts, so invalid JSON is a 400.
+    """
+    if not is_ndjson(request):
+        try:
+            body = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        if isinstance(body, dict) and list_key is not None:
+            body = body.get(list_key, [])
+        return body if isinstance(body, list) else [body]
+
+    items = []
+    buffer = b""
+    line_no = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_no}: {e}")
+    if buffer.strip():
+        try:
+            items.append(json.loads(buffer))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_no + 1}: {e}")
+    return items
+
+def ndjson_response(items):
+    """
+    StreamingResponse writing one JSON line per item of an async iterable.
+    Each line is only produced once the client has taken the previous one, so a
+    slow reader holds back the producer.
+    """
+    async def lines():
+        async for item in items:
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPES[0])
+
+def json_response(content, status_code=200):
+    """
+    JSON Response serialized with orjson when it is installed, skipping the
+    response_model validation and jsonable_encoder pass of a normal route.
+    content must hold plain JSON types (None for missing values, not NaN).
+    """
+    if orjson is not None:
+        body = orjson.dumps(content)
+    else:
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False).encode("utf-8")
+    return Response(body, status_code=status_code, media_type="application/json")
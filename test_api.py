@@ -0,0 +1,80 @@
+"""
+test_api.py
+Tests for the water quality analysis API.
+"""
+import unittest
+from unittest import mock
+import pandas as pd
+from fastapi.testclient import TestClient
+import api
+from formula_registry import FormulaRegistry, FORMULAE_SPEC, INDEX_LIBRARY
+
+COLUMNS = ["SampleID", "ParameterName", "Ci", "Si", "Ii", "MACi"]
+
+
+class TestAnalyzeBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(api.app)
+        cls.df = pd.read_csv("waterqualitydataset.csv")
+
+    def test_columnar_matches_per_sample(self):
+        samples = [{"SampleID": int(sample_id), "parameters": rows[COLUMNS[1:]].to_dict("records")}
+                   for sample_id, rows in self.df.groupby("SampleID", sort=False)]
+        expected = self.client.post("/analyze-batch", json=samples).json()
+        columns = {name: self.df[name].tolist() for name in COLUMNS}
+        response = self.client.post("/analyze-batch/columnar", json=columns).json()
+        self.assertEqual(response, {"results": expected, "errors": []})
+
+    def test_columnar_errors_per_sample(self):
+        columns = {name: self.df[name].tolist() for name in COLUMNS}
+        columns["Ci"][0] = None
+        response = self.client.post("/analyze-batch/columnar", json=columns).json()
+        self.assertEqual(response["errors"], [{"SampleID": columns["SampleID"][0],
+                                               "error": f"Missing values for {columns['ParameterName'][0]} (Ci)"}])
+        self.assertEqual(len(response["results"]), self.df["SampleID"].nunique() - 1)
+
+        columns["Si"] = columns["Si"][:-1]
+        self.assertEqual(self.client.post("/analyze-batch/columnar", json=columns).status_code, 422)
+
+    def test_standards_fill_omitted_values(self):
+        full = {name: self.df[name].tolist() for name in COLUMNS}
+        compact = {name: full[name] for name in ("SampleID", "ParameterName", "Ci")}
+        expected = self.client.post("/analyze-batch/columnar", json=full).json()
+        self.assertEqual(self.client.post("/analyze-batch/columnar", json=compact).json(), expected)
+
+        # A partial set of columns is used as sent; only the omitted ones come from the standards
+        doubled = [2 * si for si in full["Si"]]
+        expected = self.client.post("/analyze-batch/columnar", json={**full, "Si": doubled}).json()
+        self.assertEqual(self.client.post("/analyze-batch/columnar", json={**compact, "Si": doubled}).json(), expected)
+        self.assertNotEqual(expected, self.client.post("/analyze-batch/columnar", json=full).json())
+
+        compact["ParameterName"] = ["Mercury"] + compact["ParameterName"][1:]
+        response = self.client.post("/analyze-batch/columnar", json=compact).json()
+        self.assertEqual(response["errors"], [{"SampleID": compact["SampleID"][0],
+                                               "error": "Missing values for Mercury (no standard)"}])
+        self.assertEqual(self.client.post("/analyze-batch/columnar",
+                                          json={**compact, "standards": "no-such-version"}).status_code, 400)
+
+        sample = {"SampleID": 1, "parameters": [{"ParameterName": "Lead", "Ci": 0.031}, {"ParameterName": "pH", "Ci": 8.9}]}
+        with_values = {"SampleID": 1, "parameters": [
+            {"ParameterName": "Lead", "Ci": 0.031, "Si": 0.05, "Ii": 0.0, "MACi": 0.01},
+            {"ParameterName": "pH", "Ci": 8.9, "Si": 8.5, "Ii": 7.0, "MACi": 9.0}]}
+        self.assertEqual(self.client.post("/analyze", json=sample).json(),
+                         self.client.post("/analyze", json=with_values).json())
+        self.assertEqual(self.client.get("/standards").json()["default"], "dataset-v1")
+
+    def test_analyze_reports_registry_indices(self):
+        sample = {"SampleID": 7, "parameters": self.df[self.df["SampleID"] == 1][COLUMNS[1:]].to_dict("records")}
+        before = self.client.post("/analyze", json=sample).json()
+        registry = FormulaRegistry(FORMULAE_SPEC)
+        registry.add_index("MI", **INDEX_LIBRARY["MI"])
+        with mock.patch.object(api, "FORMULAE", registry):
+            after = self.client.post("/analyze", json=sample).json()
+        self.assertEqual(list(after), list(before) + ["MI", "MI_Category"])
+        self.assertEqual({k: after[k] for k in before}, before)
+        self.assertEqual(after["MI"], after["HEI"])   # MI is sum(Ci / MACi), like HEI
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+test_cold_start.py
+Import-time budget for the API modules: heavy dependencies are loaded on first use.
+"""
+import unittest
+import os
+import subprocess
+import sys
+
+# Seconds of cumulative import time (python -X importtime), with ample headroom;
+# pandas alone takes ~0.4s and RDKit's descriptor modules another ~0.2s
+IMPORT_BUDGET = {"deepchem_integration": 0.4, "deepchem_api": 1.2, "api": 1.2}
+DEFERRED = ("pandas", "rdkit", "requests")
+
+
+def measure_import(module):
+    code = f"import sys, {module}; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6, proc.stdout.strip()
+    raise AssertionError(f"no import time reported for {module}")
+
+
+class TestColdStart(unittest.TestCase):
+    def test_import_budget(self):
+        for module, budget in IMPORT_BUDGET.items():
+            with self.subTest(module=module):
+                seconds, loaded = measure_import(module)
+                self.assertEqual(loaded, "", f"{module} imported {loaded} eagerly")
+                self.assertLess(seconds, budget)
+
+    def test_warm_loads_deferred_work(self):
+        import deepchem_integration
+        deepchem_integration.warm_in_background().join()
+        self.assertIn("rdkit.Chem.QED", sys.modules)
+        self.assertIsNotNone(deepchem_integration._zinc)
+        self.assertIs(deepchem_integration.QED, sys.modules["rdkit.Chem.QED"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,10 +4,22 @@ Unit tests for DeepChem integration and property prediction workflow.
 """
 import unittest
 import os
-from deepchem_integration import load_smiles, get_all_properties, ZINC_LOCAL, PROPERTIES  
+import asyncio
+import tempfile
+from unittest import mock
+import deepchem_integration
+from deepchem_integration import load_smiles, get_all_properties, get_precomputed_row, get_zinc_table, ZINC_LOCAL, PROPERTIES  
 
 
 class TestDeepChemIntegration(unittest.TestCase):
+    def setUp(self):
+        # A fresh property cache per test, so every test sees live computation first
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(deepchem_integration, "PROPERTY_CACHE", os.path.join(tmp.name, "cache.sqlite"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     # Removed test_download_zinc_dataset (no longer needed)
     def test_load_smiles(self):
         smiles_list = load_smiles()
@@ -48,5 +60,250 @@ class TestDeepChemIntegration(unittest.TestCase):
         self.assertTrue(isinstance(props['toxicological_endpoints'], (dict, type(None))))
         self.assertTrue(isinstance(props['custom_hmpi'], (float, type(None))))
 
+    def test_precomputed_row_lookup(self):
+        df, index = get_zinc_table()
+        smiles = load_smiles()[3]
+        row = get_precomputed_row(" " + smiles + "\n")
+        self.assertEqual(row['smiles'], smiles)
+        self.assertEqual(float(row['logP']), float(df[df['smiles'] == smiles].iloc[0]['logP']))
+        self.assertIsNone(get_precomputed_row("not-a-smiles"))
+        # Any spelling of a dataset molecule finds its row
+        other = deepchem_integration.Chem.MolToSmiles(deepchem_integration.Chem.MolFromSmiles(smiles), rootedAtAtom=2)
+        self.assertNotEqual(other, smiles)
+        self.assertEqual(get_precomputed_row(other)['smiles'], smiles)
+        # Loaded once and shared
+        self.assertIs(get_zinc_table()[0], df)
+
+    def test_non_canonical_dataset_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "zinc.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                # Ethanol only in non-canonical spellings, the second one a duplicate
+                f.write('smiles,logP,qed,SAS\nOCC,1.5,0.4,4.0\nC(O)C,9.5,0.9,1.0\nc1ccccc1,2.0,0.4,1.0\n')
+            try:
+                with mock.patch.object(deepchem_integration, "ZINC_LOCAL", path):
+                    get_zinc_table(reload=True)
+                    for spelling in ("OCC", "CCO", "C(O)C", "OC([H])C"):
+                        self.assertEqual(float(get_precomputed_row(spelling)["logP"]), 1.5)
+                    ethanol = get_all_properties("OCC")
+                    self.assertEqual(get_all_properties("C(O)C"), {**ethanol, "smiles": "C(O)C"})
+                    self.assertEqual(deepchem_integration.batch_properties(["CCO", "C(O)C"]),
+                                     [{**ethanol, "smiles": "CCO"}, {**ethanol, "smiles": "C(O)C"}])
+                    # The canonical keys are computed once per file version
+                    self.assertTrue(os.path.exists(path + ".canonical"))
+                    with mock.patch.object(deepchem_integration, "_canonical_chunk") as parsed:
+                        get_zinc_table(reload=True)
+                    self.assertEqual(parsed.call_count, 0)
+            finally:
+                get_zinc_table(reload=True)
+
+    def test_single_parse_per_molecule(self):
+        smiles = "CN1CCC[C@H]1c1cccnc1"  # Not in the ZINC dataset, so everything is computed live
+        expected = {prop: getattr(deepchem_integration, f"predict_{prop}")(smiles) for prop in PROPERTIES}
+        get_zinc_table()    # loading the dataset parses it once, not per lookup
+        parse = deepchem_integration.Chem.MolFromSmiles
+        with mock.patch.object(deepchem_integration.Chem, "MolFromSmiles", side_effect=parse) as parsed, \
+                mock.patch.object(deepchem_integration.QED, "qed", side_effect=deepchem_integration.QED.qed) as qed:
+            props = get_all_properties(smiles)
+        self.assertEqual(parsed.call_count, 1)
+        self.assertEqual(qed.call_count, 1)
+        for prop in PROPERTIES:
+            self.assertEqual(props[prop], expected[prop])
+
+    def test_batch_properties_order_and_errors(self):
+        smiles_list = load_smiles()[:6] + ["not-a-smiles", 42]
+        try:
+            # chunksize=3 forces the process pool path
+            pooled = deepchem_integration.batch_properties(smiles_list, chunksize=3)
+            single = deepchem_integration.batch_properties(smiles_list, "logP", chunksize=3)
+        finally:
+            deepchem_integration.shutdown_pool()
+        self.assertEqual(pooled[:7], [get_all_properties(s) for s in smiles_list[:7]])
+        self.assertEqual(pooled[7]["smiles"], 42)
+        self.assertIn("error", pooled[7])
+        self.assertEqual([r["smiles"] for r in single], smiles_list)
+        self.assertIsInstance(single[7]["logP"], str)
+
+    def test_descriptor_store(self):
+        smiles_list = load_smiles()[:20] + ["not-a-smiles"]
+        live = [get_all_properties(s) for s in smiles_list]
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(deepchem_integration.build_descriptor_store(path, smiles_list), 20)
+            with mock.patch.object(deepchem_integration, "DESCRIPTOR_STORE", path):
+                store = deepchem_integration.get_descriptor_store()
+                self.assertIsNotNone(deepchem_integration.lookup_descriptors(smiles_list[0]))
+                with mock.patch.object(deepchem_integration.Chem, "MolFromSmiles") as parsed:
+                    stored = [get_all_properties(s) for s in smiles_list[:20]]
+                self.assertEqual(parsed.call_count, 0)
+                self.assertEqual(stored, live[:20])
+                self.assertEqual(get_all_properties("not-a-smiles"), live[20])
+                self.assertEqual(store.meta["version"], deepchem_integration.PREDICTOR_VERSION)
+
+    def test_descriptor_store_rebuild_keeps_open_store_readable(self):
+        smiles_list = load_smiles()[:30]
+        with tempfile.TemporaryDirectory() as path:
+            deepchem_integration.build_descriptor_store(path, smiles_list[:10])
+            old = deepchem_integration.DescriptorStore(path)
+            keys = old.keys.copy()
+            logp = old.columns["logP"].copy()
+
+            # A larger rebuild would show through (or SIGBUS, if smaller) an in-place overwrite
+            deepchem_integration.build_descriptor_store(path, smiles_list)
+            self.assertEqual(old.keys.tolist(), keys.tolist())
+            self.assertEqual(old.columns["logP"].tolist(), logp.tolist())
+            self.assertEqual(len(deepchem_integration.DescriptorStore(path).keys), 30)
+            self.assertFalse([f for f in os.listdir(path) if f.endswith(".tmp")])
+
+    def test_stream_batch_properties(self):
+        smiles_list = load_smiles()[:10] + ["not-a-smiles"]
+
+        async def collect():
+            return [r async for r in deepchem_integration.stream_batch_properties(smiles_list, chunksize=3, max_pending=2)]
+
+        try:
+            streamed = asyncio.run(collect())
+        finally:
+            deepchem_integration.shutdown_pool()
+        self.assertEqual(streamed, [get_all_properties(s) for s in smiles_list])
+
+    def test_selected_properties_single_pass(self):
+        smiles = "CN1CCC[C@H]1c1cccnc1"
+        parse = deepchem_integration.Chem.MolFromSmiles
+        with mock.patch.object(deepchem_integration.Chem, "MolFromSmiles", side_effect=parse) as parsed, \
+                mock.patch.object(deepchem_integration.QED, "qed", side_effect=deepchem_integration.QED.qed) as qed:
+            props = deepchem_integration.get_properties(smiles, ["bioactivity", "mutagenicity"])
+            self.assertEqual(qed.call_count, 0)
+            props.update(deepchem_integration.get_properties(smiles, ["toxicity", "binding_affinity", "custom_hmpi"]))
+        self.assertEqual(parsed.call_count, 2)  # once per call, shared by every selected property
+        self.assertEqual(qed.call_count, 1)
+        expected = get_all_properties(smiles)
+        self.assertEqual(props, {key: expected[key] for key in props})
+        with self.assertRaises(ValueError):
+            deepchem_integration.batch_properties([smiles], ["not-a-property"])
+
+    def test_property_cache_survives_restart(self):
+        smiles_list = ["CN1CCC[C@H]1c1cccnc1", "OCC", "not-a-smiles"]
+        live = [get_all_properties(s) for s in smiles_list]
+        cache = deepchem_integration.get_property_cache()
+        cache.flush()
+        self.assertEqual(len(cache), 4)  # nicotine, OCC and its canonical CCO, not-a-smiles
+        # Sharing the entry is only right because every spelling computes the same values
+        ethanol = deepchem_integration._live_properties(deepchem_integration.MoleculeContext("CCO"))
+        self.assertEqual(ethanol, {**live[1], "smiles": "CCO"})
+
+        # A new process: no in-memory state, nothing may be computed again
+        with mock.patch.dict(deepchem_integration._property_caches, clear=True), \
+                mock.patch.object(deepchem_integration, "_live_properties", side_effect=AssertionError("recomputed")):
+            self.assertEqual(get_all_properties("CCO"), ethanol)
+            batch = deepchem_integration.batch_properties(smiles_list + [" OCC"])
+            self.assertEqual(batch, live + [{**live[1], "smiles": " OCC"}])
+            self.assertEqual(deepchem_integration.batch_properties(smiles_list[:2], "logP"),
+                             [{"smiles": s, "logP": r["logP"]} for s, r in zip(smiles_list[:2], live)])
+
+        with mock.patch.object(deepchem_integration, "PREDICTOR_VERSION", deepchem_integration.PREDICTOR_VERSION + 1):
+            self.assertEqual(deepchem_integration.get_property_cache().get_many(["CCO", "OCC"]), {})
+
+    def test_older_predictor_version_is_not_served(self):
+        live = deepchem_integration._live_properties(deepchem_integration.MoleculeContext("OCC"))
+        stale = {**live, "solubility": -99.0}
+        del stale["smiles"]
+        old = deepchem_integration.PropertyCache(deepchem_integration.PROPERTY_CACHE,
+                                                 deepchem_integration.PREDICTOR_VERSION - 1)
+        old.put_many([("OCC", stale), ("CCO", stale)])
+        old.flush()
+
+        self.assertEqual(get_all_properties("OCC"), live)
+        self.assertEqual(deepchem_integration.batch_properties(["OCC", "CCO"]), [live, {**live, "smiles": "CCO"}])
+
+    def test_bulk_computes_each_molecule_once(self):
+        smiles_list = ["OCC", "CCO", " CCO", "C(O)C", "CCO", "not-a-smiles", "CN1CCC[C@H]1c1cccnc1"]
+        live = deepchem_integration._live_properties
+        with mock.patch.object(deepchem_integration, "_live_properties", side_effect=live) as computed:
+            results = deepchem_integration.batch_properties(smiles_list)
+        self.assertEqual(computed.call_count, 3)  # ethanol, not-a-smiles, nicotine
+        self.assertEqual([r["smiles"] for r in results], smiles_list)
+        ethanol = {**get_all_properties("CCO"), "smiles": None}
+        self.assertTrue(all({**r, "smiles": None} == ethanol for r in results[:5]))
+        self.assertEqual(results[5:], [get_all_properties(s) for s in smiles_list[5:]])
+
+        # Subsets are served from the cached property sets
+        deepchem_integration.get_property_cache().flush()
+        with mock.patch.object(deepchem_integration, "get_properties") as computed, \
+                mock.patch.object(deepchem_integration, "_live_properties", side_effect=AssertionError("recomputed")):
+            logp = asyncio.run(deepchem_integration.batch_properties_async(smiles_list, ["logP"]))
+            # A new spelling is parsed once and found under its canonical SMILES
+            self.assertEqual(deepchem_integration.batch_properties([" C(C)O"]), [{**results[1], "smiles": " C(C)O"}])
+        self.assertEqual(computed.call_count, 0)
+        self.assertEqual(logp, [{"smiles": r["smiles"], "logP": r["logP"]} for r in results])
+
+    def test_similarity_index(self):
+        from rdkit import DataStructs
+        from rdkit.Chem import rdFingerprintGenerator
+        smiles_list = load_smiles()[:300] + ["not-a-smiles"]
+        generator = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=2048)
+        fps = [generator.GetFingerprint(deepchem_integration.Chem.MolFromSmiles(s)) for s in smiles_list[:300]]
+        queries = [smiles_list[7], "CN1CCC[C@H]1c1cccnc1"]
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(deepchem_integration.build_fingerprint_index(path, smiles_list, chunksize=128), 300)
+            with mock.patch.object(deepchem_integration, "FINGERPRINT_INDEX", path):
+                for query in queries:
+                    expected = DataStructs.BulkTanimotoSimilarity(
+                        generator.GetFingerprint(deepchem_integration.Chem.MolFromSmiles(query)), fps)
+                    best = sorted(range(300), key=lambda i: (-expected[i], i))
+                    found = deepchem_integration.similar_molecules(query, k=5)
+                    self.assertEqual([r["similarity"] for r in found], [round(expected[i], 4) for i in best[:5]])
+                    # The count bounds skip rows but never a molecule above the threshold
+                    above = deepchem_integration.similar_molecules(query, k=300, min_similarity=0.3)
+                    self.assertEqual(len(above), sum(sim >= 0.3 for sim in expected))
+                self.assertEqual(deepchem_integration.similar_molecules(queries[0], k=1)[0],
+                                 {"smiles": queries[0], "similarity": 1.0})
+                with self.assertRaises(ValueError):
+                    deepchem_integration.similar_molecules("not-a-smiles")
+
+                try:
+                    batch = deepchem_integration.similar_molecules_batch(queries + ["not-a-smiles"], k=5, chunksize=1)
+                finally:
+                    deepchem_integration.shutdown_pool()
+                self.assertEqual(batch[:2], [{"smiles": q, "results": deepchem_integration.similar_molecules(q, k=5)}
+                                             for q in queries])
+                self.assertIn("error", batch[2])
+        with mock.patch.object(deepchem_integration, "FINGERPRINT_INDEX", os.path.join(path, "missing")):
+            with self.assertRaises(FileNotFoundError):
+                deepchem_integration.similar_molecules("CCO")
+
+    def test_fingerprint_index_rebuild_keeps_open_index_readable(self):
+        smiles_list = load_smiles()[:60]
+        with tempfile.TemporaryDirectory() as path:
+            deepchem_integration.build_fingerprint_index(path, smiles_list[:20])
+            old = deepchem_integration.FingerprintIndex(path)
+            query = deepchem_integration.morgan_fingerprint(smiles_list[3])
+            positions, similarities = old.search(query, k=5)
+            found = (old.smiles[positions].tolist(), similarities.tolist())
+
+            # A larger rebuild would show through (or SIGBUS, if smaller) an in-place overwrite
+            deepchem_integration.build_fingerprint_index(path, smiles_list)
+            self.assertEqual(len(old), 20)
+            positions, similarities = old.search(query, k=5)
+            self.assertEqual((old.smiles[positions].tolist(), similarities.tolist()), found)
+            self.assertEqual(len(deepchem_integration.FingerprintIndex(path)), 60)
+            self.assertFalse([f for f in os.listdir(path) if f.endswith(".tmp")])
+
+    def test_smiles_pages_and_filters(self):
+        df, _ = get_zinc_table()
+        ranges = {"logP": (1, None), "qed": (None, 0.6)}
+        expected = df[(df["logP"] >= 1) & (df["qed"] <= 0.6)]["smiles"].tolist()
+        pages, cursor = [], None
+        while True:
+            page = deepchem_integration.smiles_page(cursor, 500, ranges)
+            pages += page["smiles"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(pages, expected)
+        lines = "".join(deepchem_integration.iter_smiles_lines(ranges, batch_size=700)).splitlines()
+        self.assertEqual(lines, expected)
+        with self.assertRaises(ValueError):
+            deepchem_integration.smiles_page("not-a-cursor")
+
 if __name__ == "__main__":
     unittest.main()
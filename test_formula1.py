@@ -0,0 +1,70 @@
+"""
+test_formula1.py
+Unit tests for the water quality index formulae (per-sample and batch).
+"""
+import unittest
+import os
+import math
+import tempfile
+import pandas as pd
+from formula1 import (calculate_indices, categorize_indices, calculate_indices_batch, categorize_indices_batch,
+                      results_frame, iter_indices_csv)
+
+
+class TestBatchIndices(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.read_csv("waterqualitydataset.csv")
+
+    def assertSameIndices(self, expected, actual):
+        for e, a in zip(expected, actual):
+            if math.isnan(e):
+                self.assertTrue(math.isnan(a))
+            else:
+                self.assertAlmostEqual(e, a, places=9)
+
+    def test_batch_matches_per_sample(self):
+        indices = calculate_indices_batch(self.df)
+        categories = categorize_indices_batch(indices)
+        self.assertEqual(len(indices), self.df["SampleID"].nunique())
+        for sample_id, sample_df in self.df.groupby("SampleID"):
+            expected = calculate_indices(sample_df)
+            self.assertSameIndices(expected, indices.loc[sample_id].tolist())
+            self.assertEqual(categorize_indices(*expected), tuple(categories.loc[sample_id]))
+
+    def test_invalid_rows_and_empty_samples(self):
+        df = pd.DataFrame({
+            "SampleID": [1, 1, 1, 2, 2],
+            "ParameterName": ["pH", "Lead", "Iron", "pH", "Lead"],
+            "Ci": [7.2, "bad", 0.4, 6.8, 0.07],
+            "Si": [8.5, 0.05, 0, 0, None],
+            "Ii": [7, 0, 0.1, 7, 0],
+            "MACi": [9, 0.01, 1.0, 9, 0.01],
+        })
+        indices = calculate_indices_batch(df)
+        for sample_id, sample_df in df.groupby("SampleID"):
+            self.assertSameIndices(calculate_indices(sample_df), indices.loc[sample_id].tolist())
+        self.assertTrue(math.isnan(indices.loc[2, "HPI"]))
+        self.assertEqual(categorize_indices_batch(indices).loc[2, "HPI_Category"], "unsafe")
+
+    def test_streaming_matches_batch(self):
+        expected = results_frame(calculate_indices_batch(self.df))
+        # Chunk sizes that split samples across chunk boundaries
+        for chunksize in (1, 7, 1000):
+            streamed = pd.concat(list(iter_indices_csv("waterqualitydataset.csv", chunksize=chunksize)),
+                                 ignore_index=True)
+            pd.testing.assert_frame_equal(expected, streamed)
+
+    def test_streaming_rejects_non_contiguous_samples(self):
+        rows = self.df[self.df["SampleID"].isin([1, 2])]
+        shuffled = pd.concat([rows[rows["SampleID"] == 1].iloc[:2], rows[rows["SampleID"] == 2],
+                              rows[rows["SampleID"] == 1].iloc[2:]])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "samples.csv")
+            shuffled.to_csv(path, index=False)
+            for chunksize in (1, 3, 1000):
+                with self.assertRaises(ValueError):
+                    list(iter_indices_csv(path, chunksize=chunksize, check_contiguous=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+test_formula_registry.py
+Unit tests for the declarative, vectorised formula registry.
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from formula_registry import FormulaRegistry, FORMULAE_SPEC, INDEX_LIBRARY
+from formulae import calculate_indices
+
+
+class TestFormulaRegistry(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.read_csv("waterqualitydataset.csv")
+        self.codes, self.samples = pd.factorize(self.df["SampleID"])
+        self.columns = {col: self.df[col].to_numpy(dtype=float) for col in ["Ci", "Si", "Ii", "MACi"]}
+
+    def test_formulae_spec_matches_per_sample(self):
+        values = FormulaRegistry(FORMULAE_SPEC).evaluate(self.codes, len(self.samples), self.columns)
+        for i, sample_id in enumerate(self.samples):
+            sample = self.df[self.df["SampleID"] == sample_id]
+            # The formulas written out by hand, independently of the registry
+            qi = ((sample["Ci"] - sample["Ii"]) / (sample["Si"] - sample["Ii"])) * 100
+            wi = (1 / sample["Si"]) / (1 / sample["Si"]).sum()
+            expected = [(qi * wi).sum() / wi.sum(), (sample["Ci"] / sample["MACi"]).sum(),
+                        (sample["Ci"] / sample["Si"] - 1).sum()]
+            np.testing.assert_allclose([values[name][i] for name in ("HPI", "HEI", "Cd")], expected, rtol=1e-12)
+            np.testing.assert_allclose(calculate_indices(sample), expected, rtol=1e-12)
+
+    def test_added_indices_evaluate_in_the_same_pass(self):
+        registry = FormulaRegistry(FORMULAE_SPEC)
+        for name in ("MI", "PN"):
+            registry.add_index(name, **INDEX_LIBRARY[name])
+        self.assertEqual(registry.indices, ("HPI", "HEI", "Cd", "MI", "PN"))
+        values = registry.evaluate(self.codes, len(self.samples), self.columns)
+        categories = registry.categorize(values)
+
+        pi = self.df["Ci"] / self.df["Si"]
+        grouped = pi.groupby(self.df["SampleID"], sort=False)
+        nemerow = np.sqrt((grouped.max() ** 2 + grouped.mean() ** 2) / 2)
+        np.testing.assert_allclose(values["PN"], nemerow.to_numpy(), rtol=1e-12)
+        np.testing.assert_allclose(values["MI"], values["HEI"])
+        self.assertEqual(set(categories), {"HPI_Category", "HEI_Category", "Cd_Category", "MI_Category",
+                                           "PN_Category", "OverallConclusion"})
+        self.assertTrue(set(categories["PN_Category"]) <= set(INDEX_LIBRARY["PN"]["labels"]))
+
+    def test_invalid_declarations(self):
+        registry = FormulaRegistry(FORMULAE_SPEC)
+        for expr in ("Ci / Si", "sum(Unknown)", "__import__('os')", "sum(Ci) if Ci else 0"):
+            with self.assertRaises(ValueError):
+                registry.add_index("Bad", expr)
+        with self.assertRaises(ValueError):
+            registry.add_index("Bad", "sum(Ci)", thresholds=[1], labels=["only one"])
+        self.assertEqual(registry.indices, ("HPI", "HEI", "Cd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
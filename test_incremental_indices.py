@@ -0,0 +1,57 @@
+"""
+test_incremental_indices.py
+Unit tests for the incremental per-sample index aggregator.
+"""
+import unittest
+import math
+import random
+import pandas as pd
+from formula1 import calculate_indices_batch, results_frame
+from incremental_indices import IndexAggregator
+
+
+class TestIndexAggregator(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.read_csv("waterqualitydataset.csv")
+
+    def test_events_match_batch_recomputation(self):
+        rng = random.Random(0)
+        aggregator = IndexAggregator()
+        current = {}
+        odd_values = [0, -1, math.inf, float("nan"), "bad"]
+        for step, row in enumerate(rng.choices(self.df.to_dict("records"), k=3000)):
+            key = (row["SampleID"] % 5, row["ParameterName"])
+            values = {col: rng.choice(odd_values) if rng.random() < 0.05 else row[col]
+                      for col in ["Ci", "Si", "Ii", "MACi"]}
+            if key not in current:
+                aggregator.apply({"event": "add", "SampleID": key[0], "ParameterName": key[1], **values})
+                current[key] = values
+            elif rng.random() < 0.3:
+                aggregator.apply({"event": "remove", "SampleID": key[0], "ParameterName": key[1]})
+                del current[key]
+            else:
+                aggregator.apply({"event": "replace", "SampleID": key[0], "ParameterName": key[1], **values})
+                current[key] = values
+
+        readings = pd.DataFrame([{"SampleID": s, "ParameterName": p, **v} for (s, p), v in current.items()])
+        expected = results_frame(calculate_indices_batch(readings))
+        pd.testing.assert_frame_equal(aggregator.results(), expected, check_dtype=False)
+        restored = IndexAggregator.from_frame(aggregator.snapshot())
+        pd.testing.assert_frame_equal(restored.results(), expected, check_dtype=False)
+
+    def test_invalid_events(self):
+        aggregator = IndexAggregator()
+        aggregator.add(1, "Lead", 0.02, 0.01, 0, 0.01)
+        self.assertEqual(aggregator.result(1)[3:], ("unsafe", "low pollution", "medium", "Unsafe"))
+        with self.assertRaises(KeyError):
+            aggregator.add(1, "Lead", 0.01, 0.01, 0, 0.01)
+        with self.assertRaises(KeyError):
+            aggregator.replace(1, "Iron", 0.01, 0.3, 0, 1)
+        with self.assertRaises(ValueError):
+            aggregator.apply({"event": "upsert", "SampleID": 1, "ParameterName": "Lead"})
+        aggregator.remove(1, "Lead")
+        self.assertNotIn(1, aggregator)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+test_reaction_engine.py
+Unit tests for the heavy metal reaction engine.
+"""
+import unittest
+import io
+import contextlib
+import json
+import os
+import tempfile
+import pickle
+from main import HeavyMetalReactionEngine
+
+
+class TestReactionEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            cls.engine = HeavyMetalReactionEngine("reactions.json")
+        cls.load_output = out.getvalue()
+
+    def test_malformed_reported_once_at_load(self):
+        self.assertEqual(self.engine.compiled.malformed, ("Sb + H2O slow hydrolysis",))
+        self.assertEqual(self.load_output.count("Skipping malformed equation"), 1)
+
+    def test_inverted_index(self):
+        compiled = self.engine.compiled
+        cd = compiled.species_id["Cd"]
+        self.assertEqual(compiled.species[cd], "Cd")
+        for order in compiled.by_reactant[cd]:
+            self.assertIn("Cd", compiled.reactions[order].reactants)
+            self.assertTrue(compiled.reactions[order].reactant_mask >> cd & 1)
+        with self.assertRaises(TypeError):
+            compiled.species_id["Cd"] = 0
+        with self.assertRaises(ValueError):
+            compiled.incidence[cd, 0] = 1
+
+    def test_enabled_wave(self):
+        present = self.engine.species_mask(["As", "Cd", "H2O", "NotASpecies"])
+        reactions = self.engine.compiled.reactions
+        expected = [r.order for r in reactions
+                    if all(x in ("As", "Cd", "H2O") for x in r.reactants) and r.product not in ("As", "Cd", "H2O")]
+        self.assertEqual(self.engine.enabled_reactions(present).tolist(), expected)
+
+    def test_simulation_is_silent(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            chain = self.engine.simulate_reactions(["As", "O2", "Cd", "SO4", "H2O"], {})
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual([step["product"] for step in chain], ["Cd3As2", "Cd(OH)2"])
+        self.assertEqual(chain[0], {"equation": "As + Cd -> Cd3As2", "type": "heavy_metal", "product": "Cd3As2"})
+
+    def test_compiled_registry_pickles(self):
+        restored = pickle.loads(pickle.dumps(self.engine.compiled))
+        self.assertEqual(restored.reactions, self.engine.compiled.reactions)
+        self.assertEqual(dict(restored.species_id), dict(self.engine.compiled.species_id))
+        with self.assertRaises(TypeError):
+            restored.species_id["Cd"] = 0
+        self.assertFalse(restored.incidence.flags.writeable)
+
+    def test_bulk_matches_single_calls(self):
+        samples = [(["As", "Cd", "H2O"], {}), (["Pb", "O2", "CO2"], {}), (["H2O", "As", "Cd"], {"humidity": 60}),
+                   (["Hg", "S", "Cl2"], {})] * 3
+        engine = HeavyMetalReactionEngine.from_compiled(self.engine.compiled)
+        calls = []
+        pooled = engine.simulate_bulk(samples, processes=2, progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(pooled, [engine.simulate_reactions(species, env) for species, env in samples])
+        self.assertEqual(engine.simulate_bulk(samples, processes=1), pooled)
+        self.assertEqual(calls[-1], (3, 3))  # three unique compositions
+
+
+class TestSaturation(unittest.TestCase):
+    def setUp(self):
+        # X0 + B -> X1, X1 + B -> X2, ... : a 15-step chain
+        registry = [{
+            "element": "Test",
+            "reactions_with_heavy_metals": [f"X{i} + B -> X{i + 1}" for i in range(15)],
+            "reactions_with_environment": ["X3 + O2 -> Y"],
+        }]
+        fd, self.path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(registry, f)
+        self.engine = HeavyMetalReactionEngine(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_reaches_fixpoint_past_ten_steps(self):
+        chain = self.engine.simulate_reactions(["X0", "B", "O2"], {})
+        products = [step["product"] for step in chain]
+        self.assertEqual(len(chain), 16)
+        # Y is enabled once X3 exists but fires after the earlier-registered chain
+        self.assertEqual(products[-2:], ["X15", "Y"])
+        self.assertEqual(chain, self.engine.simulate_reactions(["O2", "B", "X0"], {}))
+
+    def test_max_depth(self):
+        chain = self.engine.simulate_reactions(["X0", "B", "O2"], {}, max_depth=4)
+        self.assertEqual([step["product"] for step in chain], ["X1", "X2", "X3", "X4", "Y"])
+        self.assertEqual(self.engine.simulate_reactions(["X0", "B"], {}, max_depth=0), [])
+
+    def test_cache_counters_and_canonical_key(self):
+        engine = HeavyMetalReactionEngine(self.path, cache_size=2)
+        first = engine.simulate_reactions(["X0", "B"], {"temperature": 30})
+        first.append("mutated by caller")
+        again = engine.simulate_reactions(["B", "X0", "B"], {"temperature": 10})
+        self.assertEqual(len(again), 15)
+        self.assertEqual(engine.cache_info()[:3], (1, 1, 0))
+
+        engine.simulate_reactions(["X1", "B"], {})
+        engine.simulate_reactions(["X2", "B"], {})
+        self.assertEqual(engine.cache_info(), (1, 3, 1, 2, 2))
+
+    def test_cache_invalidated_when_registry_changes(self):
+        self.assertEqual(len(self.engine.simulate_reactions(["X0", "B"], {})), 15)
+        with open(self.path, "w") as f:
+            json.dump([{"element": "Test", "reactions_with_heavy_metals": ["X0 + B -> Z"]}], f)
+        os.utime(self.path, ns=(0, 0))
+        self.assertEqual(self.engine.simulate_reactions(["X0", "B"], {}),
+                         [{"equation": "X0 + B -> Z", "type": "heavy_metal", "product": "Z"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+test_result_cache.py
+Unit tests for the two-tier result cache and its use by /analyze.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from fastapi.testclient import TestClient
+import api
+from result_cache import ResultCache, content_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = ResultCache(maxsize=2)
+        cache.put("a", {"x": 1})
+        cache.put("b", {"x": 2})
+        self.assertEqual(cache.get("a"), {"x": 1})
+        cache.put("c", {"x": 3})      # evicts "b", the least recently used
+        self.assertIsNone(cache.get("b"))
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.evictions, info.size), (1, 1, 1, 2))
+        self.assertEqual(info.hit_rate, 0.5)
+
+        value = cache.get("c")
+        value["x"] = 99
+        self.assertEqual(cache.get("c"), {"x": 3})
+
+    def test_ttl_and_disk_tier(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.sqlite")
+            cache = ResultCache(maxsize=10, ttl=60, path=path, clock=clock)
+            cache.put("a", [1, 2])
+            cache.close()
+
+            # A new process finds the entry on disk, then in memory
+            cache = ResultCache(maxsize=10, ttl=60, path=path, clock=clock)
+            self.assertEqual(cache.get("a"), [1, 2])
+            self.assertEqual(cache.get("a"), [1, 2])
+            self.assertEqual(cache.info()[:3], (1, 1, 0))
+
+            clock.now += 61
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+            self.assertIsNone(ResultCache(path=path, clock=clock).get("a"))
+
+    def test_disk_tier_is_bounded_and_pruned(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.sqlite")
+            cache = ResultCache(maxsize=1, ttl=60, path=path, clock=clock, disk_maxsize=3, prune_every=1)
+            for key in "abcde":
+                cache.put(key, key)
+            self.assertEqual(cache.disk_size(), 3)
+            cache.put("a", "a")         # rewriting a key makes it the newest row
+            cache.put("f", "f")
+            self.assertEqual(cache.disk_size(), 3)
+            self.assertEqual([key for key in "abcdef" if cache.get(key) is not None], ["a", "e", "f"])
+
+            # Expired rows are deleted by the next prune, not only when read
+            clock.now += 61
+            cache.put("g", "g")
+            cache.put("h", "h")
+            self.assertEqual(cache.disk_size(), 2)
+            cache.close()
+
+    def test_disk_reads_do_not_hold_the_lock(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.sqlite")
+            cache = ResultCache(maxsize=1, path=path)
+            cache.put("a", 1)
+            cache.put("b", 2)           # "a" is now only on disk
+            cache.flush()
+            self.assertFalse(cache.in_memory("a"))
+
+            # The disk read runs outside the lock, so lookups from other threads are not serialized
+            reads = []
+            real_connect = cache._connect
+
+            def connect():
+                reads.append(cache._lock.locked())
+                return real_connect()
+
+            with mock.patch.object(cache, "_connect", side_effect=connect):
+                self.assertEqual(cache.get("a"), 1)
+            self.assertEqual(reads, [False])
+            self.assertTrue(cache.in_memory("a"))
+            cache.close()
+
+    def test_content_key_ignores_dict_order(self):
+        self.assertEqual(content_key({"a": 1, "b": [2, 3]}), content_key({"b": [2, 3], "a": 1}))
+        self.assertNotEqual(content_key([1, 2]), content_key([2, 1]))
+
+
+class TestAnalyzeCache(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(api.app)
+        api.result_cache.clear()
+
+    def test_disk_lookup_runs_in_threadpool(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(path=os.path.join(tmp, "results.sqlite"))
+            sample = {"SampleID": 1, "parameters": [{"ParameterName": "Lead", "Ci": 0.031}]}
+            with mock.patch.object(api, "result_cache", cache), \
+                    mock.patch.object(api, "run_in_threadpool", side_effect=api.run_in_threadpool) as offloaded:
+                first = self.client.post("/analyze", json=sample).json()
+                self.assertEqual(offloaded.call_count, 1)     # miss: the disk was read off the loop
+                self.assertEqual(self.client.post("/analyze", json=sample).json(), first)
+                self.assertEqual(offloaded.call_count, 1)     # memory hit: answered inline
+            cache.close()
+
+    def test_repeated_sample_skips_dataframe(self):
+        parameters = [{"ParameterName": "Lead", "Ci": 0.031}, {"ParameterName": "pH", "Ci": 8.9}]
+        first = self.client.post("/analyze", json={"SampleID": 1, "parameters": parameters}).json()
+
+        # Same content in another order and under another SampleID is served from the cache
+        with mock.patch("pandas.DataFrame", side_effect=AssertionError("DataFrame built on a cache hit")):
+            again = self.client.post("/analyze-batch", json=[
+                {"SampleID": 2, "parameters": parameters[::-1]},
+                {"SampleID": 3, "parameters": parameters, "standards": "dataset-v1"},
+            ]).json()
+        self.assertEqual(again, [{**first, "SampleID": 2}, {**first, "SampleID": 3}])
+
+        stats = self.client.get("/cache").json()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+        changed = [{"ParameterName": "Lead", "Ci": 0.5}, parameters[1]]
+        self.assertNotEqual(self.client.post("/analyze", json={"SampleID": 1, "parameters": changed}).json(), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
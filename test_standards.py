@@ -0,0 +1,44 @@
+"""
+test_standards.py
+Unit tests for the versioned parameter standards table.
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from formula1 import calculate_indices_batch
+from formula_registry import FORMULA1
+from standards import get_standards, list_standards
+
+
+class TestStandards(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.read_csv("waterqualitydataset.csv")
+
+    def test_default_version_matches_dataset(self):
+        default, versions = list_standards()
+        self.assertIn(default, versions)
+        table = get_standards().frame()
+        expected = self.df.groupby("ParameterName")[["Si", "Ii", "MACi"]].first()
+        pd.testing.assert_frame_equal(table[["Si", "Ii", "MACi"]].sort_index(), expected, check_names=False)
+        self.assertEqual(table.loc["pH", "unit"], "pH units")
+        with self.assertRaises(KeyError):
+            get_standards("no-such-version")
+
+    def test_compact_rows_give_identical_indices(self):
+        compact = self.df[["SampleID", "ParameterName", "Ci"]]
+        pd.testing.assert_frame_equal(calculate_indices_batch(compact), calculate_indices_batch(self.df))
+
+    def test_constants_are_precomputed_per_parameter(self):
+        standards = get_standards()
+        constants = standards.constants(FORMULA1)
+        self.assertIs(standards.constants(FORMULA1), constants)
+        inverse = [table for table in constants.values() if np.allclose(table[:-1], 1 / standards.frame()["Si"])]
+        self.assertEqual(len(inverse), 1)
+        # Unknown parameters (code -1) get NaN standards and are dropped like Si <= 0
+        codes = standards.codes(pd.Series(["Lead", "Mercury"]))
+        self.assertEqual(codes[1], -1)
+        self.assertTrue(np.isnan(standards.columns(codes)["Si"][1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+test_timeseries.py
+Unit tests for the station time-series store and its window aggregation.
+"""
+import unittest
+import os
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from formula1 import calculate_indices_batch
+from timeseries import TimeSeriesStore, standards_from_frame
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+    def setUp(self):
+        df = pd.read_csv("waterqualitydataset.csv")
+        self.standards = standards_from_frame(df)
+        rng = np.random.default_rng(0)
+        n = 1500
+        self.readings = pd.DataFrame({
+            "Station": rng.choice(["North", "South", "East"], n),
+            "Timestamp": pd.Timestamp("2025-03-01") + pd.to_timedelta(rng.integers(0, 20 * 86400, n), unit="s"),
+            "ParameterName": rng.choice(self.standards.index, n),
+            "Ci": df["Ci"].to_numpy()[rng.integers(0, len(df), n)],
+        })
+        self.store = TimeSeriesStore(self.standards)
+        self.store.append(self.readings.iloc[:700])
+        self.store.append(self.readings.iloc[700:])
+
+    def expected_window(self, station, window_start, window_end):
+        r = self.readings
+        sel = r[(r["Station"] == station) & (r["Timestamp"] >= window_start) & (r["Timestamp"] < window_end)]
+        means = sel.groupby("ParameterName")["Ci"].mean().reset_index().join(self.standards, on="ParameterName")
+        return calculate_indices_batch(means.assign(SampleID=0)).iloc[0]
+
+    def test_rolling_windows_match_per_window_computation(self):
+        results = self.store.windows("1D", "5D", start="2025-03-06", end="2025-03-15")
+        self.assertEqual(len(results), 3 * 9)
+        self.assertTrue((results["WindowEnd"] - results["WindowStart"] == pd.Timedelta("5D")).all())
+        for row in results.itertuples():
+            expected = self.expected_window(row.Station, row.WindowStart, row.WindowEnd)
+            np.testing.assert_allclose([row.HPI, row.HEI, row.Cd], expected.to_numpy(), rtol=1e-9)
+
+    def test_sparse_fine_grained_windows(self):
+        # A year at one-minute bins: only occupied bins may cost memory
+        rng = np.random.default_rng(1)
+        readings = self.readings.iloc[:300].assign(
+            Timestamp=pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, 300), unit="s"))
+        store = TimeSeriesStore(self.standards)
+        store.append(readings)
+        tracemalloc.start()
+        try:
+            results = store.windows("1min", "30min")
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 50 * 2 ** 20)
+
+        self.readings = readings
+        self.assertEqual(len(results), len(set(zip(results["Station"], results["WindowEnd"]))))
+        for row in results.iloc[::97].itertuples():
+            expected = self.expected_window(row.Station, row.WindowStart, row.WindowEnd)
+            np.testing.assert_allclose([row.HPI, row.HEI, row.Cd], expected.to_numpy(), rtol=1e-9)
+
+    def test_tumbling_windows_and_round_trip(self):
+        tumbling = self.store.windows("1D", stations=["North"])
+        self.assertEqual(set(tumbling["Station"]), {"North"})
+        self.assertEqual(len(tumbling), 20)
+        every = self.store.windows("1D", "3D")
+        subset = every[every["Station"].isin(["South", "East"])].reset_index(drop=True)
+        pd.testing.assert_frame_equal(self.store.windows("1D", "3D", stations=["South", "East"]), subset)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store")
+            self.store.save(path)
+            loaded = TimeSeriesStore.load(path)
+        self.assertEqual(len(loaded), len(self.readings))
+        pd.testing.assert_frame_equal(loaded.windows("1D", "3D"), self.store.windows("1D", "3D"))
+        with self.assertRaises(ValueError):
+            self.store.windows("2D", "3D")
+
+
+if __name__ == "__main__":
+    unittest.main()
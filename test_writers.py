@@ -0,0 +1,71 @@
+"""
+test_writers.py
+Round-trip tests for the index pipeline output writers.
+"""
+import unittest
+import json
+import os
+import tempfile
+import pandas as pd
+from formula1 import calculate_indices_batch, results_frame
+from writers import get_writer, CSVWriter
+
+
+class TestWriters(unittest.TestCase):
+    def setUp(self):
+        df = pd.read_csv("waterqualitydataset.csv")
+        # Sample 0 has no valid rows, so its HPI is NaN
+        empty = pd.DataFrame({"SampleID": [0], "ParameterName": ["pH"], "Ci": [7.0], "Si": [0], "Ii": [7], "MACi": [9]})
+        self.results = results_frame(calculate_indices_batch(pd.concat([empty, df], ignore_index=True)))
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_blocks(self, name):
+        path = os.path.join(self.tmp.name, name)
+        with get_writer(path) as writer:
+            writer.write(self.results.iloc[:20])
+            writer.write(self.results.iloc[20:])
+        return path
+
+    def test_ndjson(self):
+        with open(self.write_blocks("out.ndjson"), encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), len(self.results))
+        self.assertIsNone(records[0]["HPI"])
+
+    def test_json_keeps_original_layout(self):
+        with open(self.write_blocks("out.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        self.assertEqual(list(records[1]), list(self.results.columns))
+        self.assertIsNone(records[0]["HPI"])
+
+    def test_parquet_and_arrow_are_typed(self):
+        for name in ("out.parquet", "out.arrow"):
+            path = self.write_blocks(name)
+            loaded = pd.read_parquet(path) if name.endswith("parquet") else pd.read_feather(path)
+            self.assertEqual(len(loaded), len(self.results))
+            self.assertEqual(str(loaded["HPI_Category"].dtype), "category")
+            self.assertEqual(loaded["OverallConclusion"].tolist(), self.results["OverallConclusion"].tolist())
+
+    def test_parquet_and_arrow_without_rows(self):
+        for name in ("empty.parquet", "empty.arrow"):
+            path = os.path.join(self.tmp.name, name)
+            with get_writer(path):
+                pass
+            loaded = pd.read_parquet(path) if name.endswith("parquet") else pd.read_feather(path)
+            self.assertEqual(len(loaded), 0)
+            self.assertEqual(list(loaded.columns), list(self.results.columns))
+            self.assertEqual(str(loaded["HPI_Category"].dtype), "category")
+
+    def test_unknown_format(self):
+        for name in ("out.txt", "out", os.path.join("runs.v2", "out")):
+            with self.assertRaises(ValueError):
+                get_writer(os.path.join(self.tmp.name, name))
+        with get_writer(os.path.join(self.tmp.name, "OUT.CSV")) as writer:
+            self.assertIsInstance(writer, CSVWriter)
+
+
+if __name__ == "__main__":
+    unittest.main()
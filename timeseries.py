@@ -0,0 +1,218 @@
+"""
+Time-series store for long-format station readings (Station, Timestamp,
+ParameterName, Ci) with tumbling and rolling window index aggregation.
+
+Readings are kept as compact columns: categorical codes for stations and
+parameters, int64 nanosecond timestamps and float64 concentrations. A window
+query sums the selected readings per occupied (station, parameter, bin) key,
+forms rolling windows as differences of cumulative sums found by binary
+search, and evaluates every non-empty window as one sample in a single formula
+registry pass. Within a window each parameter's Ci is the mean of its readings.
+"""
+import os
+import numpy as np
+import pandas as pd
+from formula_registry import FORMULA1
+from standards import Standards, get_standards
+
+READING_COLUMNS = ["Station", "Timestamp", "ParameterName", "Ci"]
+STANDARD_COLUMNS = ["Si", "Ii", "MACi"]
+
+
+def standards_from_frame(df):
+    """Per-parameter Si, Ii and MACi taken from a long-format sample table (first row per parameter)."""
+    return df.groupby("ParameterName")[STANDARD_COLUMNS].first()
+
+
+def _ranges(starts, lengths):
+    # np.arange(start, start + length) for every pair, concatenated
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(int(np.sum(lengths)))
+
+
+class TimeSeriesStore:
+    """
+    Readings of many stations over time. standards is a standards.Standards, a
+    standards version name (default: the default version) or a frame indexed by
+    ParameterName with Si, Ii and MACi columns. Parameters without a standard
+    get NaN, which the formula1 definitions drop.
+    """
+    def __init__(self, standards=None):
+        if standards is None or isinstance(standards, str):
+            standards = get_standards(standards)
+        elif not isinstance(standards, Standards):
+            standards = Standards.from_frame(standards[STANDARD_COLUMNS].astype(float))
+        self.standards = standards
+        self.stations = pd.Index([])
+        self.parameters = pd.Index([])
+        self._station = np.empty(0, dtype=np.int32)
+        self._parameter = np.empty(0, dtype=np.int32)
+        self._time = np.empty(0, dtype=np.int64)
+        self._ci = np.empty(0, dtype=np.float64)
+        self._pending = []
+
+    def __len__(self):
+        self._consolidate()
+        return len(self._time)
+
+    def append(self, readings):
+        """Adds a frame of readings; they are sorted into the store on the next query."""
+        readings = readings[READING_COLUMNS]
+        self.stations = self.stations.append(pd.Index(readings["Station"].unique()).difference(self.stations))
+        self.parameters = self.parameters.append(
+            pd.Index(readings["ParameterName"].unique()).difference(self.parameters))
+        self._pending.append((
+            self.stations.get_indexer(readings["Station"]).astype(np.int32),
+            self.parameters.get_indexer(readings["ParameterName"]).astype(np.int32),
+            pd.to_datetime(readings["Timestamp"]).to_numpy(dtype="datetime64[ns]").view(np.int64),
+            pd.to_numeric(readings["Ci"], errors="coerce").to_numpy(dtype=np.float64),
+        ))
+
+    def _consolidate(self):
+        # Merge pending appends and keep every column sorted by time
+        if not self._pending:
+            return
+        parts = [(self._station, self._parameter, self._time, self._ci)] + self._pending
+        station, parameter, time, ci = (np.concatenate(cols) for cols in zip(*parts))
+        order = np.argsort(time, kind="stable")
+        self._station, self._parameter, self._time, self._ci = station[order], parameter[order], time[order], ci[order]
+        self._pending = []
+
+    def readings(self, start=None, end=None, stations=None):
+        """The stored readings in [start, end) as a frame, optionally for some stations only."""
+        self._consolidate()
+        lo, hi, keep = self._select(start, end, stations)
+        return pd.DataFrame({
+            "Station": self.stations[self._station[lo:hi][keep]],
+            "Timestamp": self._time[lo:hi][keep].view("datetime64[ns]"),
+            "ParameterName": self.parameters[self._parameter[lo:hi][keep]],
+            "Ci": self._ci[lo:hi][keep],
+        })
+
+    def _select(self, start, end, stations):
+        lo = 0 if start is None else np.searchsorted(self._time, pd.Timestamp(start).value, side="left")
+        hi = len(self._time) if end is None else np.searchsorted(self._time, pd.Timestamp(end).value, side="left")
+        keep = slice(None)
+        if stations is not None:
+            keep = np.isin(self._station[lo:hi], self.stations.get_indexer(pd.Index(stations)))
+        return lo, hi, keep
+
+    def windows(self, freq="1D", window=None, start=None, end=None, stations=None, registry=FORMULA1):
+        """
+        Indices per station and window over [start, end). Windows step by freq;
+        window (a multiple of freq, default freq) is their length, so the
+        default gives tumbling windows and e.g. freq="1D", window="7D" a 7-day
+        rolling window per day. Rolling windows that start before start still
+        use the earlier readings. Returns Station, WindowStart, WindowEnd, the
+        registry's indices and categories for every window with readings.
+        """
+        self._consolidate()
+        step = pd.Timedelta(freq).value
+        length = pd.Timedelta(window or freq).value
+        if step <= 0 or length % step:
+            raise ValueError("window must be a positive multiple of freq")
+        span = length // step
+
+        if start is None:
+            if not len(self._time):
+                return self._empty_windows(registry)
+            start = pd.Timestamp(self._time[0])
+        first_bin = pd.Timestamp(start).floor(freq).value
+        lo, hi, keep = self._select(pd.Timestamp(first_bin - (span - 1) * step), end, stations)
+        station = self._station[lo:hi][keep]
+        parameter = self._parameter[lo:hi][keep]
+        time = self._time[lo:hi][keep]
+        ci = self._ci[lo:hi][keep]
+        valid = ~np.isnan(ci)
+        station, parameter, time, ci = station[valid], parameter[valid], time[valid], ci[valid]
+        if not len(time):
+            return self._empty_windows(registry)
+
+        # Bin 0 starts span - 1 steps early. Stations and parameters are renumbered over
+        # the selected readings, and each (station, parameter) pair is one series.
+        origin = first_bin - (span - 1) * step
+        bins = (time - origin) // step
+        station_codes, station = np.unique(station, return_inverse=True)
+        parameter_codes, parameter = np.unique(parameter, return_inverse=True)
+        n_params, last_bin = len(parameter_codes), int(bins.max())
+        n_bins = last_bin + 1
+        series = station.astype(np.int64) * n_params + parameter
+
+        # Ci sums and counts of the occupied (series, bin) keys only, so memory follows the
+        # number of readings rather than the time span divided by freq; as cumulative sums
+        # over the sorted keys, any run of bins of a series is a difference of two entries
+        keys, inverse = np.unique(series * n_bins + bins, return_inverse=True)
+        sums = np.concatenate([[0.0], np.cumsum(np.bincount(inverse, weights=ci))])
+        counts = np.concatenate([[0], np.cumsum(np.bincount(inverse))])
+
+        # A series has readings in the windows ending at bins [b, b + span - 1] for each of its
+        # occupied bins b: merge those intervals per series, within [span - 1, last_bin]
+        key_series, key_bin = np.divmod(keys, n_bins)
+        first = np.maximum(key_bin, span - 1)
+        last = np.minimum(key_bin + span - 1, last_bin)
+        inside = first <= last
+        key_series, first, last = key_series[inside], first[inside], last[inside]
+        if not len(first):
+            return self._empty_windows(registry)
+        new = np.r_[True, (key_series[1:] != key_series[:-1]) | (first[1:] > last[:-1] + 1)]
+        lengths = last[np.r_[new[1:], True]] - first[new] + 1
+        pair_bin = _ranges(first[new], lengths)
+        pair_series = np.repeat(key_series[new], lengths)
+
+        # Every (series, window) pair is one row of the batch, with the mean Ci of its bins
+        hi = np.searchsorted(keys, pair_series * n_bins + pair_bin, side="right")
+        lo = np.searchsorted(keys, pair_series * n_bins + np.maximum(pair_bin - span, -1), side="right")
+        ci = (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
+
+        # Rows sorted by station, window and parameter, so each new run is the next window
+        pair_station, pair_parameter = np.divmod(pair_series, n_params)
+        window_key = pair_station * n_bins + pair_bin
+        order = np.lexsort((pair_parameter, window_key))
+        window_key, pair_parameter, ci = window_key[order], pair_parameter[order], ci[order]
+        new_window = np.diff(window_key, prepend=-1) != 0
+        codes = np.cumsum(new_window) - 1
+        window_station, window_bin = np.divmod(window_key[new_window], n_bins)
+        parameters = self.standards.codes(self.parameters)[parameter_codes[pair_parameter]]
+        values = self.standards.evaluate(registry, codes, len(window_bin), parameters, ci)
+
+        window_end = first_bin + (window_bin - span + 2) * step
+        results = pd.DataFrame({
+            "Station": self.stations[station_codes[window_station]],
+            "WindowStart": pd.to_datetime(window_end - length),
+            "WindowEnd": pd.to_datetime(window_end),
+        })
+        for name, col in values.items():
+            results[name] = col
+        for name, col in registry.categorize(values).items():
+            results[name] = col
+        return results
+
+    def _empty_windows(self, registry):
+        columns = ["Station", "WindowStart", "WindowEnd", *registry.indices]
+        columns += list(registry.categorize({name: np.empty(0) for name in registry.indices}))
+        return pd.DataFrame(columns=columns)
+
+    def save(self, path):
+        """Writes the readings (parquet, categorical columns) and standards to the directory path."""
+        os.makedirs(path, exist_ok=True)
+        self._consolidate()
+        pd.DataFrame({
+            "Station": pd.Categorical.from_codes(self._station, categories=self.stations),
+            "Timestamp": self._time.view("datetime64[ns]"),
+            "ParameterName": pd.Categorical.from_codes(self._parameter, categories=self.parameters),
+            "Ci": self._ci,
+        }).to_parquet(os.path.join(path, "readings.parquet"), index=False)
+        self.standards.frame().to_csv(os.path.join(path, "standards.csv"))
+
+    @classmethod
+    def load(cls, path):
+        table = pd.read_csv(os.path.join(path, "standards.csv"), index_col="ParameterName")
+        store = cls(Standards.from_frame(table))
+        readings = pd.read_parquet(os.path.join(path, "readings.parquet"))
+        store.stations = pd.Index(readings["Station"].cat.categories)
+        store.parameters = pd.Index(readings["ParameterName"].cat.categories)
+        store._station = readings["Station"].cat.codes.to_numpy(dtype=np.int32)
+        store._parameter = readings["ParameterName"].cat.codes.to_numpy(dtype=np.int32)
+        store._time = readings["Timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        store._ci = readings["Ci"].to_numpy(dtype=np.float64)
+        return store
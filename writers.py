@@ -0,0 +1,191 @@
+"""
+Output stage for the index pipeline.
+Every writer takes result frames (see formula1.results_frame) one block at a
+time through write() and is closed with close() or a with-block.
+"""
+import os
+import json
+import pandas as pd
+
+# Fixed label sets so every block shares the same category dictionary
+CATEGORY_LEVELS = {
+    "HPI_Category": ["safe", "caution", "unsafe"],
+    "HEI_Category": ["low pollution", "medium", "high"],
+    "Cd_Category": ["low contamination", "medium", "high"],
+    "OverallConclusion": ["Safe", "Moderate / Caution", "Unsafe"],
+}
+
+RESULT_COLUMNS = ["SampleID", "HPI", "HPI_Category", "HEI", "HEI_Category", "Cd", "Cd_Category",
+                  "OverallConclusion"]
+
+def empty_results():
+    """A zero-row result frame in the results_frame layout."""
+    return pd.DataFrame({col: pd.Series(dtype="int64" if col == "SampleID" else "object") for col in RESULT_COLUMNS})
+
+def import_pyarrow():
+    """Returns (pyarrow, pyarrow.parquet), with a clear error when pyarrow is missing."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet and Arrow output need pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+def typed_frame(results):
+    """
+    Casts a result frame to its storage dtypes: float64 indices and
+    category dtypes for the *_Category / OverallConclusion fields.
+    """
+    results = results.copy()
+    for col in ["HPI", "HEI", "Cd"]:
+        results[col] = results[col].astype("float64")
+    for col, levels in CATEGORY_LEVELS.items():
+        results[col] = pd.Categorical(results[col], categories=levels)
+    return results
+
+
+class ResultWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, results):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NDJSONWriter(ResultWriter):
+    """One JSON object per line, flushed after every block."""
+    def __init__(self, path):
+        super().__init__(path)
+        self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, results):
+        if results.empty:
+            return
+        self.f.write(results.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class CSVWriter(ResultWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.f = open(path, "w", encoding="utf-8", newline="")
+        self.header = True
+
+    def write(self, results):
+        results.to_csv(self.f, header=self.header, index=False)
+        self.f.flush()
+        self.header = False
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter(ResultWriter):
+    """Parquet file with one row group per block."""
+    def __init__(self, path):
+        super().__init__(path)
+        self._pa, self._pq = import_pyarrow()
+        self.writer = None
+
+    def write(self, results):
+        table = self._pa.Table.from_pandas(typed_frame(results), preserve_index=False)
+        if self.writer is None:
+            self.writer = self._pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            # No blocks: still leave a readable file with the result schema
+            self.write(empty_results())
+        self.writer.close()
+
+
+class ArrowWriter(ResultWriter):
+    """Arrow IPC (Feather v2) file with one record batch per block."""
+    def __init__(self, path):
+        super().__init__(path)
+        self._pa, _ = import_pyarrow()
+        self.sink = None
+        self.writer = None
+
+    def write(self, results):
+        table = self._pa.Table.from_pandas(typed_frame(results), preserve_index=False)
+        if self.writer is None:
+            self.sink = self._pa.OSFile(self.path, "wb")
+            self.writer = self._pa.ipc.new_file(self.sink, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            self.write(empty_results())
+        self.writer.close()
+        self.sink.close()
+
+
+class JSONWriter(ResultWriter):
+    """The original indented output.json layout (buffered until close)."""
+    def __init__(self, path):
+        super().__init__(path)
+        self.records = []
+
+    def write(self, results):
+        results = results.astype(object).where(results.notna(), None)
+        self.records.extend(results.to_dict(orient="records"))
+
+    def close(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, indent=4, ensure_ascii=False)
+
+
+class ExcelWriter(ResultWriter):
+    """Single-sheet .xlsx (buffered until close, needs openpyxl)."""
+    def __init__(self, path):
+        super().__init__(path)
+        self.blocks = []
+
+    def write(self, results):
+        self.blocks.append(results)
+
+    def close(self):
+        results = pd.concat(self.blocks, ignore_index=True) if self.blocks else pd.DataFrame()
+        results.to_excel(self.path, index=False)
+
+
+WRITERS = {
+    "ndjson": NDJSONWriter,
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+    "json": JSONWriter,
+    "xlsx": ExcelWriter,
+}
+
+EXTENSIONS = {
+    ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".parquet": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".json": "json", ".xlsx": "xlsx",
+}
+
+def get_writer(path, fmt=None):
+    """
+    Returns the writer for fmt, or for the extension of path when fmt is None.
+    """
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in EXTENSIONS:
+            raise ValueError(f"Cannot infer output format from '{path}', choose one of {list(WRITERS)}")
+        fmt = EXTENSIONS[ext]
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown output format '{fmt}', choose one of {list(WRITERS)}")
+    return WRITERS[fmt](path)